@@ -0,0 +1,205 @@
+"""
+Servidor Authentik simulado para los benchmarks.
+
+Implementa lo mínimo que usa la aplicación:
+- OIDC: /application/o/authorize/, /application/o/token/ (authorization_code y refresh_token)
+  y /application/o/<slug>/jwks/, emitiendo JWT RS256 de prueba.
+- API: /api/v3/core/users/, /api/v3/core/groups/, /api/v3/rbac/roles/ y
+  /api/v3/propertymappings/provider/scope/ con paginación al estilo de Authentik.
+
+El volumen de datos, la latencia y la tasa de errores se configuran con variables de entorno
+(FAKE_USERS, FAKE_GROUPS, FAKE_ROLES, FAKE_SCOPES, FAKE_LATENCY_MS, FAKE_ERROR_RATE).
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import secrets
+from urllib.parse import urlencode
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+CLIENT_ID = os.getenv("FAKE_CLIENT_ID", "bench-client")
+NUM_USERS = int(os.getenv("FAKE_USERS", "1000"))
+NUM_GROUPS = int(os.getenv("FAKE_GROUPS", "20"))
+NUM_ROLES = int(os.getenv("FAKE_ROLES", "10"))
+NUM_SCOPES = int(os.getenv("FAKE_SCOPES", "20"))
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "20"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+TOKEN_LIFETIME = int(os.getenv("FAKE_TOKEN_LIFETIME", "3600"))
+KID = "bench-key"
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+_jwk = json.loads(RSAAlgorithm.to_jwk(_private_key.public_key()))
+_jwk.update({"kid": KID, "alg": "RS256", "use": "sig"})
+
+app = FastAPI()
+_codes = {}
+
+ROLES = [{"pk": f"role-{i}", "name": f"Rol {i}"} for i in range(NUM_ROLES)]
+GROUPS = [
+    {
+        "pk": f"group-{i}",
+        "num_pk": i,
+        "name": "Administrador" if i == 0 else f"Grupo {i}",
+        "is_superuser": i == 0,
+        "roles": [ROLES[i % NUM_ROLES]["pk"]] if NUM_ROLES else [],
+        "roles_obj": [ROLES[i % NUM_ROLES]] if NUM_ROLES else [],
+        "users": [],
+    }
+    for i in range(NUM_GROUPS)
+]
+USERS = []
+for i in range(NUM_USERS):
+    group = GROUPS[i % NUM_GROUPS] if NUM_GROUPS else None
+    USERS.append({
+        "pk": i + 1,
+        "username": f"usuario{i}",
+        "name": f"Usuario {i}",
+        "email": f"usuario{i}@example.com",
+        "is_active": True,
+        "last_login": None,
+        "last_updated": "2025-01-01T00:00:00Z",
+        "uid": secrets.token_hex(16),
+        "attributes": {"cedula": f"V{10000000 + i}", "rif": f"J{30000000 + i}", "telefono": "0000"},
+        "groups": [group["pk"]] if group else [],
+        "groups_obj": [{"pk": group["pk"], "name": group["name"]}] if group else [],
+    })
+    if group:
+        group["users"].append(i + 1)
+SCOPES = [
+    {"pk": f"scope-{i}", "name": f"Mapping {i}", "scope_name": f"scope_{i}", "description": "", "expression": "return {}"}
+    for i in range(NUM_SCOPES)
+]
+
+
+async def _simulate():
+    """Aplica la latencia configurada y devuelve una respuesta de error según ERROR_RATE."""
+    if LATENCY_MS:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * LATENCY_MS / 1000)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return JSONResponse({"detail": "Error simulado"}, status_code=500)
+    return None
+
+
+def _paginate(request: Request, items: list) -> dict:
+    page = max(int(request.query_params.get("page", 1)), 1)
+    page_size = max(int(request.query_params.get("page_size", 20)), 1)
+    total_pages = max((len(items) + page_size - 1) // page_size, 1)
+    return {
+        "pagination": {
+            "count": len(items),
+            "current": page,
+            "total_pages": total_pages,
+            "next": page + 1 if page < total_pages else 0,
+            "previous": page - 1 if page > 1 else 0,
+            "start_index": (page - 1) * page_size + 1,
+            "end_index": min(page * page_size, len(items)),
+        },
+        "results": items[(page - 1) * page_size: page * page_size],
+    }
+
+
+def _issue_tokens(nonce=None) -> dict:
+    now = int(time.time())
+    claims = {
+        "iss": "fake-authentik",
+        "sub": "bench-user",
+        "aud": CLIENT_ID,
+        "iat": now,
+        "exp": now + TOKEN_LIFETIME,
+        "email": "bench@example.com",
+        "email_verified": True,
+        "name": "Usuario Benchmark",
+        "given_name": "Usuario",
+        "preferred_username": "bench",
+        "nickname": "bench",
+        "groups": ["Administrador"],
+        "cedula": "V12345678",
+        "rif": "J123456789",
+        "telefono": "0000",
+    }
+    access_token = jwt.encode(claims, _private_key, algorithm="RS256", headers={"kid": KID})
+    id_claims = dict(claims)
+    if nonce:
+        id_claims["nonce"] = nonce
+    id_token = jwt.encode(id_claims, _private_key, algorithm="RS256", headers={"kid": KID})
+    return {
+        "access_token": access_token,
+        "id_token": id_token,
+        "refresh_token": secrets.token_urlsafe(24),
+        "token_type": "Bearer",
+        "expires_in": TOKEN_LIFETIME,
+        "scope": "openid profile email offline_access",
+    }
+
+
+@app.get("/application/o/authorize/")
+async def authorize(request: Request):
+    params = request.query_params
+    code = secrets.token_urlsafe(16)
+    _codes[code] = params.get("nonce")
+    query = urlencode({"code": code, "state": params.get("state", "")})
+    return RedirectResponse(f"{params['redirect_uri']}?{query}", status_code=302)
+
+
+@app.post("/application/o/token/")
+async def token(request: Request):
+    error = await _simulate()
+    if error is not None:
+        return error
+    form = await request.form()
+    grant_type = form.get("grant_type")
+    if grant_type == "authorization_code":
+        code = form.get("code")
+        if code not in _codes:
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        return JSONResponse(_issue_tokens(_codes.pop(code)))
+    if grant_type == "refresh_token":
+        return JSONResponse(_issue_tokens())
+    return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+
+
+@app.get("/application/o/{slug}/jwks/")
+async def jwks(slug: str):
+    return {"keys": [_jwk]}
+
+
+@app.get("/api/v3/core/users/")
+async def users(request: Request):
+    error = await _simulate()
+    group_pks = request.query_params.getlist("groups_by_pk")
+    users = [user for user in USERS if set(user["groups"]) & set(group_pks)] if group_pks else USERS
+    return error or JSONResponse(_paginate(request, users))
+
+
+@app.get("/api/v3/core/groups/")
+async def groups(request: Request):
+    error = await _simulate()
+    return error or JSONResponse(_paginate(request, GROUPS))
+
+
+@app.get("/api/v3/rbac/roles/")
+async def roles(request: Request):
+    error = await _simulate()
+    return error or JSONResponse(_paginate(request, ROLES))
+
+
+@app.get("/api/v3/propertymappings/provider/scope/")
+async def scopes(request: Request):
+    error = await _simulate()
+    return error or JSONResponse(_paginate(request, SCOPES))
+
+
+@app.post("/api/v3/propertymappings/provider/scope/")
+async def create_scope(request: Request):
+    error = await _simulate()
+    if error is not None:
+        return error
+    data = await request.json()
+    scope = {"pk": f"scope-{secrets.token_hex(4)}", **data}
+    return JSONResponse(scope, status_code=201)
@@ -0,0 +1,272 @@
+"""
+Benchmark de carga de la aplicación contra un Authentik simulado.
+
+Arranca benchmarks/fake_authentik.py y la aplicación (benchmarks/serve_app.py) con uvicorn,
+ejecuta los escenarios indicados con la concurrencia pedida y muestra p50/p95/p99, peticiones
+por segundo y tiempo de bloqueo del event loop. Los resultados se guardan en
+benchmarks/results/<commit>-<fecha>.json para comparar ejecuciones entre commits.
+
+Uso:
+    python -m benchmarks.run --concurrency 20 --duration 30 --users 5000 --latency-ms 20
+    python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+import httpx
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+CLIENT_ID = "bench-client"
+ALL_SCENARIOS = ["dashboard", "users", "groups", "roles", "access", "scopes", "create_scope", "callback"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _start_server(module: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR,
+        env={**os.environ, **env},
+    )
+
+
+def _wait_ready(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió a tiempo: {url}")
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+# --- Escenarios -------------------------------------------------------------------------------
+
+async def login(client: httpx.AsyncClient, idp: httpx.AsyncClient) -> httpx.Response:
+    """Flujo OAuth completo; devuelve la respuesta de /oauth/callback."""
+    response = await client.get("/oauth/authorize")
+    response = await idp.get(response.headers["location"])
+    return await client.get(response.headers["location"])
+
+
+async def scenario(name: str, client: httpx.AsyncClient, idp: httpx.AsyncClient, counter: int):
+    """Ejecuta un escenario y devuelve (latencia en segundos, éxito)."""
+    if name == "callback":
+        # Solo se mide la petición a /oauth/callback (intercambio del código por el token)
+        response = await client.get("/oauth/authorize")
+        response = await idp.get(response.headers["location"])
+        start = time.perf_counter()
+        response = await client.get(response.headers["location"])
+        return time.perf_counter() - start, response.status_code in (302, 303, 307)
+    start = time.perf_counter()
+    if name == "dashboard":
+        response = await client.get("/dashboard")
+        ok = response.status_code == 200
+    elif name == "users":
+        response = await client.get("/admin/users", params={"page": counter % 20 + 1})
+        ok = response.status_code == 200
+    elif name in ("groups", "roles", "access", "scopes"):
+        response = await client.get(f"/admin/{name}")
+        ok = response.status_code == 200
+    elif name == "create_scope":
+        response = await client.post("/admin/scopes", data={
+            "mapping_name": f"Bench {counter}",
+            "scope_name": f"bench_{counter}",
+            "description": "Benchmark",
+            "expression": "return {}",
+        })
+        ok = response.status_code == 303
+    else:
+        raise ValueError(f"Escenario desconocido: {name}")
+    return time.perf_counter() - start, ok
+
+
+async def worker(app_url: str, scenarios: list, deadline: float, results: dict):
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client, httpx.AsyncClient(timeout=60) as idp:
+        await login(client, idp)
+        counter = random.randrange(len(scenarios))
+        while time.perf_counter() < deadline:
+            name = scenarios[counter % len(scenarios)]
+            counter += 1
+            try:
+                elapsed, ok = await scenario(name, client, idp, counter)
+            except httpx.HTTPError:
+                elapsed, ok = 0.0, False
+            entry = results.setdefault(name, {"latencies": [], "errors": 0})
+            if ok:
+                entry["latencies"].append(elapsed)
+            else:
+                entry["errors"] += 1
+
+
+async def drive(app_url: str, scenarios: list, concurrency: int, duration: float, warmup: float) -> dict:
+    if warmup:
+        await asyncio.gather(*[worker(app_url, scenarios, time.perf_counter() + warmup, {}) for _ in range(concurrency)])
+    async with httpx.AsyncClient(base_url=app_url) as client:
+        await client.post("/__bench__/loop/reset")
+        results: dict = {}
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[worker(app_url, scenarios, deadline, results) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        loop = (await client.get("/__bench__/loop")).json()
+    return {"results": results, "elapsed": elapsed, "loop": loop}
+
+
+def summarize(raw: dict) -> dict:
+    endpoints = {}
+    total = 0
+    for name, entry in sorted(raw["results"].items()):
+        latencies = sorted(entry["latencies"])
+        total += len(latencies) + entry["errors"]
+        endpoints[name] = {
+            "count": len(latencies),
+            "errors": entry["errors"],
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "rps": round(len(latencies) / raw["elapsed"], 2),
+        }
+    return {
+        "endpoints": endpoints,
+        "total": {"requests": total, "duration_s": round(raw["elapsed"], 2), "rps": round(total / raw["elapsed"], 2)},
+        "event_loop": raw["loop"],
+    }
+
+
+def print_report(report: dict):
+    print(f"\nCommit {report['commit']} - {report['timestamp']}")
+    print(f"{'Escenario':<14}{'OK':>8}{'Err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, stats in report["endpoints"].items():
+        print(f"{name:<14}{stats['count']:>8}{stats['errors']:>6}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['rps']:>10}")
+    total = report["total"]
+    loop = report["event_loop"]
+    print(f"\nTotal: {total['requests']} peticiones en {total['duration_s']} s ({total['rps']} req/s)")
+    print(f"Event loop: {loop['blocked_ms']} ms bloqueado, retraso máximo {loop['max_lag_ms']} ms")
+
+
+def compare(path_a: str, path_b: str):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+
+    def delta(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"Comparando {a['commit']} ({path_a}) -> {b['commit']} ({path_b})")
+    print(f"{'Escenario':<14}{'Métrica':<8}{'Antes':>10}{'Después':>10}{'Cambio':>10}")
+    for name in sorted(set(a["endpoints"]) | set(b["endpoints"])):
+        old, new = a["endpoints"].get(name), b["endpoints"].get(name)
+        if not old or not new:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            print(f"{name:<14}{metric:<8}{old[metric]:>10}{new[metric]:>10}{delta(old[metric], new[metric]):>10}")
+    print(f"{'total':<14}{'rps':<8}{a['total']['rps']:>10}{b['total']['rps']:>10}{delta(a['total']['rps'], b['total']['rps']):>10}")
+    print(f"{'event_loop':<14}{'blk ms':<8}{a['event_loop']['blocked_ms']:>10}{b['event_loop']['blocked_ms']:>10}"
+          f"{delta(a['event_loop']['blocked_ms'], b['event_loop']['blocked_ms']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la aplicación contra un Authentik simulado")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20, help="segundos de medición")
+    parser.add_argument("--warmup", type=float, default=3, help="segundos de calentamiento previos")
+    parser.add_argument("--scenarios", default=",".join(ALL_SCENARIOS))
+    parser.add_argument("--users", type=int, default=1000, help="usuarios en el Authentik simulado")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--roles", type=int, default=10)
+    parser.add_argument("--scopes", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20, help="latencia media simulada de Authentik")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 500 de Authentik")
+    parser.add_argument("--output", help="archivo de resultados (por defecto benchmarks/results/<commit>-<fecha>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"), help="compara dos archivos de resultados")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    fake_port, app_port = _free_port(), _free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    fake_env = {
+        "FAKE_CLIENT_ID": CLIENT_ID,
+        "FAKE_USERS": str(args.users),
+        "FAKE_GROUPS": str(args.groups),
+        "FAKE_ROLES": str(args.roles),
+        "FAKE_SCOPES": str(args.scopes),
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+    }
+    app_env = {
+        "AUTHENTIK_URL": fake_url,
+        "AUTHENTIK_CLIENT_ID": CLIENT_ID,
+        "AUTHENTIK_CLIENT_SECRET": "bench-secret",
+        "AUTHENTIK_JWKS_URL": f"{fake_url}/application/o/bench/jwks/",
+        "AUTHENTIK_REDIRECT_URI": f"{app_url}/oauth/callback",
+        "AUTHENTIK_LOGOUT_URL": f"{fake_url}/application/o/bench/end-session/",
+        "INTERNAL_TOKEN": "bench-internal-token",
+        "SESSION_SECRET_KEY": "bench-session-secret",
+        # Muestreo del event loop más fino que el de producción para detectar bloqueos cortos
+        "METRICS_LOOP_INTERVAL": "0.01",
+    }
+    processes = [_start_server("benchmarks.fake_authentik:app", fake_port, fake_env)]
+    try:
+        _wait_ready(f"{fake_url}/application/o/bench/jwks/")
+        processes.append(_start_server("benchmarks.serve_app:app", app_port, app_env))
+        _wait_ready(f"{app_url}/__bench__/loop")
+        raw = asyncio.run(drive(app_url, scenarios, args.concurrency, args.duration, args.warmup))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        **summarize(raw),
+    }
+    print_report(report)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+Punto de entrada de la aplicación para los benchmarks: la construye con `main.create_app()` y
+expone en /__bench__/loop los totales del medidor del event loop de services.metrics (el mismo
+que alimenta /metrics), que la aplicación arranca en su lifespan.
+"""
+from fastapi.responses import JSONResponse
+from main import create_app
+from services.metrics import loop_monitor
+
+app = create_app()
+
+
+@app.get("/__bench__/loop")
+async def bench_loop():
+    return JSONResponse(loop_monitor.snapshot())
+
+
+@app.post("/__bench__/loop/reset")
+async def bench_loop_reset():
+    loop_monitor.reset()
+    return JSONResponse(loop_monitor.snapshot())
@@ -1,16 +1,18 @@
 import os
-import secrets
-import time
-import jwt
-import requests
-from fastapi.templating import Jinja2Templates
 from authlib.integrations.starlette_client import OAuth # type: ignore
-from dotenv import load_dotenv # type: ignore
-
-load_dotenv()
+# El .env lo carga main.py antes de importar este módulo
+from services.templating import create_templates
+from services.static_assets import StaticAssets
 
 url = os.getenv("AUTHENTIK_URL")
-templates = Jinja2Templates(directory="templates")
+# Entorno de plantillas único para toda la aplicación
+templates = create_templates("templates")
+# Archivos estáticos con huella de contenido; `static_url('styles.css')` en las plantillas
+static_assets = StaticAssets("static")
+templates.env.globals["static_url"] = static_assets.url
+# Cliente OAuth con Authentik, registrado una sola vez para toda la aplicación.
+# Con AUTHENTIK_METADATA_URL (.well-known/openid-configuration) los metadatos OIDC se
+# descargan al arrancar, junto con el JWKS, en lugar de en el primer login.
 oauth = OAuth()
 
 oauth.register(
@@ -21,6 +23,7 @@ oauth.register(
     access_token_url=f'{url}/application/o/token/',
     refresh_token_url=f'{url}/application/o/token/',
     redirect_uri=os.getenv("AUTHENTIK_REDIRECT_URI"),
-    client_kwargs={'scope': 'openid profile email usuario_venezolano'},
-    jwks_uri=os.getenv("AUTHENTIK_JWKS_URL")
+    client_kwargs={'scope': 'openid profile email usuario_venezolano offline_access'},
+    jwks_uri=os.getenv("AUTHENTIK_JWKS_URL"),
+    server_metadata_url=os.getenv("AUTHENTIK_METADATA_URL"),
 )
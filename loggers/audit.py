@@ -0,0 +1,402 @@
+"""
+Consulta de auditoría sobre los archivos de log (logs/<fecha>.log y sus rotaciones .1 ... .5).
+
+Los archivos se leen con mmap (sin cargarlos en memoria) guiados por un índice auxiliar en
+logs/.audit_index.json que, para cada archivo, guarda los rangos de bytes de cada intervalo de
+AUDIT_BUCKET_SECONDS segundos y, como mapa de bits, en qué intervalos aparece cada usuario, IP
+y nivel. El índice se amplía de forma incremental a medida que los archivos crecen, así que una
+consulta solo lee los fragmentos que pueden contener resultados.
+
+Uso desde la línea de comandos:
+    python -m loggers.audit --user jperez --since 2025-01-01 --until 2025-01-02
+    python -m loggers.audit --ip 10.0.0.5 --level WARNING --json
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+import argparse
+import threading
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from loggers.logger import LOG_DIR, TZ
+
+# Tamaño en segundos de cada intervalo del índice
+AUDIT_BUCKET_SECONDS = int(os.getenv("AUDIT_BUCKET_SECONDS", "60"))
+# Archivo del índice auxiliar
+AUDIT_INDEX_FILE = os.getenv("AUDIT_INDEX_FILE", os.path.join(LOG_DIR, ".audit_index.json"))
+# Segundos mínimos entre escrituras del índice cuando solo crece el archivo de log actual
+AUDIT_INDEX_SAVE_INTERVAL = float(os.getenv("AUDIT_INDEX_SAVE_INTERVAL", "60"))
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+_LOG_FILE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.log(?:\.(\d+))?$")
+_TEXT_FIELDS = (
+    ("time", "Time: "), ("level", "Level: "), ("device", "Device: "), ("user", "User: "),
+    ("ip", "IP: "), ("func", "Func: "), ("msg", "Msg: "),
+)
+
+
+@lru_cache(maxsize=4096)
+def _minute_epoch(minute: str) -> Optional[float]:
+    try:
+        return datetime.strptime(minute, "%Y-%m-%d %H:%M").replace(tzinfo=TZ).timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_time(value: str) -> Optional[float]:
+    """Convierte la hora del log ("2025-01-01 10:20:30,123", hora local) a epoch."""
+    # strptime solo se ejecuta una vez por minuto distinto
+    minute = _minute_epoch(value[:16])
+    if minute is None:
+        return None
+    try:
+        return minute + int(value[17:19]) + int(value[20:23] or 0) / 1000
+    except ValueError:
+        return minute
+
+
+def parse_line(line: bytes) -> Optional[dict]:
+    """Interpreta una línea de log (formato texto o JSON); None si no es el inicio de un registro."""
+    if line.startswith(b"{"):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        record = {field: str(data.get(field, "")) for field, _ in _TEXT_FIELDS}
+    elif line.startswith(b"Time: "):
+        # El formateador elimina "|" de los campos anteriores a Msg, así que las seis primeras
+        # apariciones de " | " son siempre separadores y el resto pertenece al mensaje
+        parts = line.decode("utf-8", "replace").split(" | ", 6)
+        if len(parts) < len(_TEXT_FIELDS):
+            return None
+        record = {}
+        for (field, prefix), part in zip(_TEXT_FIELDS, parts):
+            if not part.startswith(prefix):
+                return None
+            record[field] = part[len(prefix):]
+    else:
+        return None
+    record["ts"] = _parse_time(record["time"])
+    return record if record["ts"] is not None else None
+
+
+def _signature(mm, length: int) -> str:
+    """Huella del inicio del archivo, para detectar que un inodo se reutilizó para otro archivo."""
+    return hashlib.sha1(mm[:length]).hexdigest()
+
+
+def _new_index(inode: int, mm, size: int) -> dict:
+    head = min(size, 256)
+    return {
+        "inode": inode, "head": head, "signature": _signature(mm, head),
+        "size": 0, "segments": [], "users": {}, "ips": {}, "levels": {},
+    }
+
+
+def _add_posting(postings: dict, key: str, segment: int):
+    # Cada clave guarda un mapa de bits con los segmentos en los que aparece
+    postings[key] = postings.get(key, 0) | (1 << segment)
+
+
+def extend_index(index: dict, mm, size: int) -> bool:
+    """
+    Indexa las líneas completas añadidas desde la última vez (a partir de index["size"]).
+    Cada segmento es [inicio del intervalo, byte inicial, byte final]; las líneas de continuación
+    (p. ej. trazas de excepciones) se asignan al segmento del registro anterior.
+    """
+    pos = index["size"]
+    if pos >= size:
+        return False
+    segments = index["segments"]
+    while pos < size:
+        end = mm.find(b"\n", pos, size)
+        if end == -1:
+            break  # Línea aún incompleta: se indexará cuando termine de escribirse
+        record = parse_line(mm[pos:end])
+        if record is not None:
+            bucket = int(record["ts"] // AUDIT_BUCKET_SECONDS * AUDIT_BUCKET_SECONDS)
+            if not segments or segments[-1][0] != bucket:
+                segments.append([bucket, pos, end + 1])
+            else:
+                segments[-1][2] = end + 1
+            segment = len(segments) - 1
+            _add_posting(index["users"], record["user"], segment)
+            _add_posting(index["ips"], record["ip"], segment)
+            _add_posting(index["levels"], record["level"], segment)
+        elif segments:
+            segments[-1][2] = end + 1
+        pos = end + 1
+    changed = pos != index["size"]
+    index["size"] = pos
+    return changed
+
+
+class AuditQuery:
+    """Filtros de una consulta; los campos vacíos no filtran."""
+    def __init__(
+        self,
+        since: float,
+        until: float,
+        level: Optional[str] = None,
+        user: Optional[str] = None,
+        ip: Optional[str] = None,
+        func: Optional[str] = None,
+        text: Optional[str] = None,
+    ):
+        self.since = since
+        self.until = until
+        self.levels = set(LEVELS[LEVELS.index(level):]) if level in LEVELS else None
+        self.user = user or None
+        self.ip = ip or None
+        self.func = func or None
+        self.text = text or None
+
+    def matches(self, record: dict) -> bool:
+        return (
+            self.since <= record["ts"] < self.until
+            and (self.levels is None or record["level"] in self.levels)
+            and (self.user is None or record["user"] == self.user)
+            and (self.ip is None or record["ip"] == self.ip)
+            and (self.func is None or record["func"] == self.func)
+            and (self.text is None or self.text in record["msg"])
+        )
+
+    def segments(self, index: dict) -> List[int]:
+        """Segmentos del archivo que pueden contener resultados, según el índice."""
+        candidates = -1  # Todos los bits a 1: sin filtros indexados
+        if self.user is not None:
+            candidates &= index["users"].get(self.user, 0)
+        if self.ip is not None:
+            candidates &= index["ips"].get(self.ip, 0)
+        if self.levels is not None:
+            levels = 0
+            for level in self.levels:
+                levels |= index["levels"].get(level, 0)
+            candidates &= levels
+        selected = []
+        for number, (bucket, _, _) in enumerate(index["segments"]):
+            if bucket + AUDIT_BUCKET_SECONDS <= self.since or bucket >= self.until:
+                continue
+            if candidates >> number & 1:
+                selected.append(number)
+        return selected
+
+
+class AuditLog:
+    """Índice incremental y consultas sobre los archivos de log de una carpeta."""
+    def __init__(self, log_dir: str = LOG_DIR, index_path: str = AUDIT_INDEX_FILE):
+        self.log_dir = log_dir
+        self.index_path = index_path
+        self._indexes: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+
+    def _files(self, since: float, until: float) -> List[str]:
+        """Archivos cuya fecha cae en el rango, del más antiguo al más reciente."""
+        first = datetime.fromtimestamp(since, TZ).strftime("%Y-%m-%d")
+        last = datetime.fromtimestamp(until, TZ).strftime("%Y-%m-%d")
+        files = []
+        try:
+            names = os.listdir(self.log_dir)
+        except FileNotFoundError:
+            return []
+        for name in names:
+            match = _LOG_FILE.match(name)
+            if match and first <= match.group(1) <= last:
+                # Dentro de un día, la rotación con número más alto es la más antigua
+                files.append((match.group(1), -int(match.group(2) or 0), name))
+        return [os.path.join(self.log_dir, name) for _, _, name in sorted(files)]
+
+    def _load(self) -> Dict[str, dict]:
+        if self._indexes is None:
+            try:
+                with open(self.index_path) as f:
+                    self._indexes = json.load(f)
+            except (OSError, ValueError):
+                self._indexes = {}
+        return self._indexes
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._indexes, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def flush(self):
+        """Escribe el índice si tiene cambios pendientes (al terminar el proceso o la CLI)."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def refresh(self, paths: List[str]) -> List[Tuple[str, dict]]:
+        """Actualiza el índice de los archivos indicados y devuelve (ruta, índice) de cada uno."""
+        result = []
+        with self._lock:
+            indexes = self._load()
+            # Archivos nuevos, reemplazados o eliminados: el índice se escribe enseguida.
+            # Si solo creció un archivo ya indexado (el caso habitual, pues la aplicación escribe
+            # en el log en cada petición) se escribe como mucho cada AUDIT_INDEX_SAVE_INTERVAL
+            # segundos; mientras tanto el índice en memoria está al día y, si el proceso termina
+            # sin escribirlo, el siguiente arranque solo vuelve a indexar lo que falte.
+            changed = False
+            grown = False
+            for path in paths:
+                try:
+                    with open(path, "rb") as f:
+                        stat = os.fstat(f.fileno())
+                        if stat.st_size == 0:
+                            continue
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            # El inodo identifica el archivo aunque la rotación lo renombre
+                            key = str(stat.st_ino)
+                            index = indexes.get(key)
+                            if (
+                                index is None
+                                or index["size"] > stat.st_size
+                                or index["signature"] != _signature(mm, index["head"])
+                            ):
+                                index = indexes[key] = _new_index(stat.st_ino, mm, stat.st_size)
+                                changed = True
+                            grown = extend_index(index, mm, stat.st_size) or grown
+                except OSError:
+                    continue
+                result.append((path, index))
+            # Se descartan los índices de archivos que ya no existen (backups eliminados)
+            live = set()
+            for name in os.listdir(self.log_dir) if os.path.isdir(self.log_dir) else []:
+                if _LOG_FILE.match(name):
+                    try:
+                        live.add(str(os.stat(os.path.join(self.log_dir, name)).st_ino))
+                    except OSError:
+                        pass
+            for key in [key for key in indexes if key not in live]:
+                del indexes[key]
+                changed = True
+            self._dirty = self._dirty or changed or grown
+            if changed or (self._dirty and time.monotonic() - self._last_save >= AUDIT_INDEX_SAVE_INTERVAL):
+                self._save()
+        return result
+
+    def scan(self, query: AuditQuery, cursor: Optional[str] = None) -> Iterator[Tuple[dict, str]]:
+        """
+        Recorre en orden cronológico los registros que cumplen la consulta. Devuelve cada registro
+        con el cursor ("inodo:byte") desde el que continuar tras él.
+        """
+        resume_inode, resume_offset = None, 0
+        if cursor:
+            inode, _, offset = cursor.partition(":")
+            resume_inode, resume_offset = inode, int(offset or 0)
+        files = self.refresh(self._files(query.since, query.until))
+        if resume_inode is not None:
+            # Se omiten los archivos anteriores al del cursor
+            inodes = [str(index["inode"]) for _, index in files]
+            if resume_inode in inodes:
+                files = files[inodes.index(resume_inode):]
+            else:
+                resume_inode = None
+        for path, index in files:
+            start_offset = resume_offset if str(index["inode"]) == resume_inode else 0
+            segments = [index["segments"][n] for n in query.segments(index)]
+            segments = [s for s in segments if s[2] > start_offset]
+            if not segments:
+                continue
+            try:
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                if os.fstat(f.fileno()).st_ino != index["inode"]:
+                    continue  # El archivo rotó durante la consulta
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for _, begin, end in segments:
+                        for record, next_offset in _scan_segment(mm, max(begin, start_offset), end):
+                            if query.matches(record):
+                                yield record, f"{index['inode']}:{next_offset}"
+
+    def page(self, query: AuditQuery, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        """Una página de resultados y el cursor de la siguiente (None si no hay más)."""
+        records = []
+        next_cursor = None
+        for record, record_cursor in self.scan(query, cursor):
+            if len(records) == limit:
+                return records, next_cursor
+            records.append(record)
+            next_cursor = record_cursor
+        return records, None
+
+
+def _scan_segment(mm, begin: int, end: int) -> Iterator[Tuple[dict, int]]:
+    """Registros completos entre los bytes begin y end, uniendo las líneas de continuación."""
+    pending = None
+    pos = begin
+    while pos < end:
+        newline = mm.find(b"\n", pos, end)
+        line_end = end if newline == -1 else newline
+        line = mm[pos:line_end]
+        record = parse_line(line)
+        if record is not None:
+            if pending is not None:
+                yield pending, pos
+            pending = record
+        elif pending is not None:
+            # Se quita el tabulador con el que el formateador sangra las líneas de continuación
+            pending["msg"] += "\n" + line.decode("utf-8", "replace").removeprefix("\t")
+        pos = line_end + 1
+    if pending is not None:
+        yield pending, min(pos, end)
+
+
+def parse_datetime(value: str) -> float:
+    """Fecha ISO (p. ej. 2025-01-01 o 2025-01-01T10:30) en hora local a epoch."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=TZ)
+    return moment.timestamp()
+
+
+# Instancia única usada por la vista de auditoría
+audit_log = AuditLog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta de auditoría sobre los logs de la aplicación")
+    parser.add_argument("--since", help="inicio (ISO, hora local); por defecto hace 24 horas")
+    parser.add_argument("--until", help="fin (ISO, hora local); por defecto ahora")
+    parser.add_argument("--level", choices=LEVELS, help="nivel mínimo")
+    parser.add_argument("--user")
+    parser.add_argument("--ip")
+    parser.add_argument("--func")
+    parser.add_argument("--text", help="texto contenido en el mensaje")
+    parser.add_argument("--limit", type=int, default=0, help="máximo de registros (0 = sin límite)")
+    parser.add_argument("--json", action="store_true", help="salida en JSON lines")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    args = parser.parse_args()
+
+    now = datetime.now(TZ)
+    since = parse_datetime(args.since) if args.since else (now - timedelta(days=1)).timestamp()
+    until = parse_datetime(args.until) if args.until else now.timestamp() + 1
+    query = AuditQuery(since, until, args.level, args.user, args.ip, args.func, args.text)
+    log = audit_log if args.log_dir == LOG_DIR else AuditLog(args.log_dir, os.path.join(args.log_dir, ".audit_index.json"))
+    count = 0
+    for record, _ in log.scan(query):
+        if args.json:
+            print(json.dumps({k: v for k, v in record.items() if k != "ts"}, ensure_ascii=False))
+        else:
+            print(f"{record['time']} | {record['level']} | {record['user']} | {record['ip']} | {record['func']} | {record['msg']}")
+        count += 1
+        if args.limit and count >= args.limit:
+            break
+    log.flush()
+    print(f"{count} registros", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,88 @@
 import os
+import re
+import json
+import queue
+import atexit
 import logging
+import threading
+from contextvars import ContextVar
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
 from zoneinfo import ZoneInfo  # Disponible en Python 3.9+
 
 # Configurar la zona horaria deseada
 TIMEZONE = "America/Caracas"  # Cambia esta cadena por la zona horaria que necesites
+# Objeto de zona horaria reutilizado por todos los registros
+TZ = ZoneInfo(TIMEZONE)
 
-# Crear la carpeta de logs, si no existe
+# Carpeta de logs (se crea al escribir el primer registro, no al importar los módulos)
 LOG_DIR = "logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+
+# Modo de escritura: "queue" (los handlers solo encolan y un hilo escribe por lotes) o "sync"
+LOG_MODE = os.getenv("LOG_MODE", "queue")
+# Formato de salida: "text" (líneas separadas por |) o "json" (JSON lines)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Tamaño máximo de la cola y política cuando está llena: "drop" (descarta) o "block" (espera)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+
+# Contexto de la petición en curso, establecido por RequestContextMiddleware
+device_var: ContextVar = ContextVar("device", default=None)
+ip_var: ContextVar = ContextVar("ip", default=None)
+user_var: ContextVar = ContextVar("user", default=None)
+request_id_var: ContextVar = ContextVar("request_id", default=None)
+
+FORMAT_STR = "Time: %(asctime)s | Level: %(levelname)s | Device: %(device)s | User: %(user)s | IP: %(ip)s | Func: %(custom_func)s | Msg: %(message)s"
+# Separador de campos y caracteres de control que no pueden aparecer dentro de un campo
+_UNSAFE_FIELD = re.compile(r"[|\x00-\x1f\x7f]")
+
+
+def _local_time(timestamp=None):
+    """Convierte el instante del registro a la zona horaria configurada."""
+    return datetime.fromtimestamp(timestamp, TZ).timetuple()
+
+
+def sanitize_log_field(value) -> str:
+    """
+    Neutraliza los valores que llegan del cliente (User-Agent, IP, usuario) para que no puedan
+    cerrar su campo con " | " ni empezar una línea nueva e inventar campos o registros.
+    """
+    return _UNSAFE_FIELD.sub(lambda m: "/" if m.group(0) == "|" else " ", str(value))
+
+
+def set_log_user(user: str):
+    """Asocia el usuario autenticado a los registros restantes de la petición en curso."""
+    user_var.set(user)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Filtro que completa cada registro con el dispositivo, IP, usuario e ID de la petición
+    en curso (tomados de los contextvars) cuando no se pasan explícitamente en `extra`.
+    Se ejecuta en el hilo que emite el log, antes de encolar el registro.
+    """
+    def filter(self, record):
+        for field, var in (("device", device_var), ("ip", ip_var), ("user", user_var), ("request_id", request_id_var)):
+            if not hasattr(record, field):
+                value = var.get()
+                if value is not None:
+                    setattr(record, field, value)
+        return True
+
+
+_context_filter = RequestContextFilter()
+
 
 class CustomFormatter(logging.Formatter):
     """
     Formateador personalizado que añade información extra si no se proporciona.
     Se espera que cada registro tenga los campos 'device', 'user' e 'ip'.
     """
-    def format(self, record):
+    converter = staticmethod(_local_time)
+
+    def apply_defaults(self, record):
         if not hasattr(record, 'device'):
             record.device = "UnknownDevice"
         if not hasattr(record, 'user'):
@@ -26,29 +91,242 @@ class CustomFormatter(logging.Formatter):
             record.ip = "UnknownIP"
         if not hasattr(record, 'custom_func'):
             record.custom_func = record.funcName
-        return super().format(record)
+        for field in ('device', 'user', 'ip', 'custom_func'):
+            setattr(record, field, sanitize_log_field(getattr(record, field)))
+
+    def format(self, record):
+        self.apply_defaults(record)
+        # Las líneas de continuación (mensajes multilínea, trazas) se sangran con un tabulador:
+        # solo una línea que empieza por "Time: " inicia un registro
+        return super().format(record).replace("\n", "\n\t")
+
+
+class JSONFormatter(CustomFormatter):
+    """Formateador que emite cada registro como un objeto JSON en una sola línea."""
+    def format(self, record):
+        self.apply_defaults(record)
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "device": record.device,
+            "user": record.user,
+            "ip": record.ip,
+            "func": record.custom_func,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler que escribe en logs/<fecha>.log según la fecha (en la zona horaria
+    configurada) de cada registro: al pasar la medianoche cambia a un archivo nuevo.
+    Mantiene la rotación por tamaño dentro de cada día.
+    """
+    def __init__(self, log_dir: str, maxBytes: int = 0, backupCount: int = 0):
+        self.log_dir = log_dir
+        self.current_date = datetime.now(TZ).strftime("%Y-%m-%d")
+        self.next_date = None
+        self.defer_flush = False
+        super().__init__(self._path_for(self.current_date), maxBytes=maxBytes, backupCount=backupCount, delay=True)
+
+    def _path_for(self, date_str: str) -> str:
+        return os.path.abspath(os.path.join(self.log_dir, f"{date_str}.log"))
+
+    def shouldRollover(self, record):
+        record_date = datetime.fromtimestamp(record.created, TZ).strftime("%Y-%m-%d")
+        if record_date > self.current_date:
+            self.next_date = record_date
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        if self.next_date:
+            # Cambio de día: se cierra el archivo actual y se abre el de la nueva fecha
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.current_date = self.next_date
+            self.next_date = None
+            self.baseFilename = self._path_for(self.current_date)
+            return
+        super().doRollover()
+
+    def flush(self):
+        # Durante la escritura de un lote se omite el flush por registro
+        if not self.defer_flush:
+            super().flush()
+
+
+class BatchingQueueHandler(logging.Handler):
+    """
+    Handler que solo encola los registros; el formateo y la escritura se hacen en
+    el hilo de LogPipeline. Con la cola llena descarta el registro (política "drop")
+    o espera hasta un segundo (política "block") antes de descartarlo.
+    """
+    def __init__(self, pipeline: "LogPipeline"):
+        super().__init__()
+        self.pipeline = pipeline
+
+    def emit(self, record):
+        self.pipeline.enqueue(record)
+
+
+class LogPipeline:
+    """Cola acotada más un hilo escritor que vuelca los registros por lotes."""
+    def __init__(self, target: logging.Handler, maxsize: int, policy: str, batch_size: int, flush_interval: float):
+        self.target = target
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue" = queue.Queue(maxsize)
+        self.dropped = 0
+        self.written = 0
+        self.closed = False
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, record):
+        if self.closed:
+            # Tras el cierre del pipeline los registros se escriben directamente
+            self._write([record])
+            return
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=1)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch):
+        self.target.acquire()
+        try:
+            self.target.defer_flush = True
+            for record in batch:
+                self.target.handle(record)
+            self.target.defer_flush = False
+            self.target.flush()
+        finally:
+            self.target.defer_flush = False
+            self.target.release()
+        self.written += len(batch)
+
+    def _run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            stop = record is self._stop
+            if not stop:
+                batch.append(record)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._stop:
+                    stop = True
+                else:
+                    batch.append(record)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped, "written": self.written}
+
+    def shutdown(self):
+        """Vacía la cola, espera al hilo escritor y cierra el archivo."""
+        if self._thread.is_alive():
+            self.queue.put(self._stop)
+            self._thread.join()
+        self.closed = True
+        self.target.close()
+
+
+def _build_file_handler() -> DailyRotatingFileHandler:
+    os.makedirs(LOG_DIR, exist_ok=True)
+    handler = DailyRotatingFileHandler(LOG_DIR, maxBytes=10 * 1024 * 1024, backupCount=5)
+    handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else CustomFormatter(FORMAT_STR))
+    return handler
+
+
+# Handler compartido por todos los loggers de la aplicación (un único archivo abierto)
+_shared_handler = None
+_pipeline = None
+_lock = threading.Lock()
+
+
+def _get_shared_handler() -> logging.Handler:
+    global _shared_handler, _pipeline
+    if _shared_handler is not None:
+        return _shared_handler
+    with _lock:
+        if _shared_handler is None:
+            file_handler = _build_file_handler()
+            if LOG_MODE == "queue":
+                _pipeline = LogPipeline(file_handler, LOG_QUEUE_SIZE, LOG_QUEUE_POLICY, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+                _shared_handler = BatchingQueueHandler(_pipeline)
+                atexit.register(shutdown_logging)
+            else:
+                _shared_handler = file_handler
+        return _shared_handler
+
+
+class DeferredHandler(logging.Handler):
+    """
+    Handler que se añade a los loggers al crearlos y delega en el handler compartido, que se
+    construye con el primer registro: importar un módulo (que obtiene su logger a nivel de
+    módulo) no crea la carpeta de logs ni arranca el hilo escritor.
+    """
+    def handle(self, record):
+        return _get_shared_handler().handle(record)
+
+    def emit(self, record):
+        _get_shared_handler().emit(record)
+
+
+_deferred_handler = DeferredHandler()
+
+
+def get_log_stats() -> dict:
+    """Contadores del pipeline de logs (registros en cola, descartados y escritos)."""
+    if _pipeline is None:
+        return {"queued": 0, "dropped": 0, "written": 0}
+    return _pipeline.stats()
+
+
+def shutdown_logging():
+    """Escribe los registros pendientes y cierra el archivo de log. Se invoca al detener la aplicación."""
+    if _pipeline is not None:
+        _pipeline.shutdown()
+    elif _shared_handler is not None:
+        _shared_handler.close()
+
 
 def get_logger(logger_name: str):
     """
-    Configura un logger con RotatingFileHandler que rota los archivos cuando alcanzan 10 MB y guarda hasta 5 backups.
+    Configura un logger que escribe en logs/<fecha>.log, cambiando de archivo a medianoche y
+    rotando cuando alcanza 10 MB (hasta 5 backups). En modo "queue" (por defecto) el logger solo
+    encola los registros y un hilo dedicado los formatea y escribe por lotes.
+    Los campos device, user, ip y request_id se completan a partir del contexto de la petición.
     El formato de cada registro es:
     Time: %(asctime)s | Level: %(levelname)s | Device: %(device)s | User: %(user)s | IP: %(ip)s | Func: %(funcName)s | Msg: %(message)s
     """
-    now_tz = datetime.now(ZoneInfo(TIMEZONE))
-    date_str = now_tz.strftime("%Y-%m-%d")
-    log_file = os.path.join(LOG_DIR, f"{date_str}.log")
-
     logger = logging.getLogger(logger_name)
     logger.setLevel(logging.DEBUG)
 
-    format_str = "Time: %(asctime)s | Level: %(levelname)s | Device: %(device)s | User: %(user)s | IP: %(ip)s | Func: %(custom_func)s | Msg: %(message)s"
-    formatter = CustomFormatter(format_str)
-    formatter.converter = lambda *args: datetime.now(ZoneInfo(TIMEZONE)).timetuple()
-
-    handler = RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
-    handler.setFormatter(formatter)
-
     if not logger.handlers:
-        logger.addHandler(handler)
+        logger.addFilter(_context_filter)
+        logger.addHandler(_deferred_handler)
 
-    return logger
\ No newline at end of file
+    return logger
@@ -1,77 +1,124 @@
 import os
-from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.security import OAuth2AuthorizationCodeBearer
-from fastapi.templating import Jinja2Templates
-from authlib.integrations.starlette_client import OAuth  # type: ignore  # Para el flujo OAuth
-from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from dotenv import load_dotenv  # type: ignore
 
+# Cargar configuración del entorno (antes de importar los módulos que la leen)
+load_dotenv()
+
 # Importar el logger personalizado
-from loggers.logger import get_logger
+from loggers.logger import get_logger, shutdown_logging
+# Cliente asíncrono compartido para la API de Authentik
+from services.authentik import authentik_client, AuthentikTransport
+# Índice en memoria para la búsqueda de usuarios
+from services.user_index import user_index
+# Caché local del JWKS para verificar los tokens
+from services.security import jwks_cache
+# Medidor del retraso del event loop (expuesto en /metrics)
+from services.metrics import loop_monitor
+# Estado de precalentamiento consultado por /readyz
+from services.readiness import readiness
+# Índice de la consulta de auditoría (se escribe al detener la aplicación si tiene cambios)
+from loggers.audit import audit_log
+from middlewares.request_context import RequestContextMiddleware
+from middlewares.sessions import ServerSessionMiddleware
+from middlewares.metrics import MetricsMiddleware
+# Cliente OAuth, entorno de plantillas y archivos estáticos compartidos (definidos en core)
+from core import oauth, templates, static_assets
+from services.templating import precompile_templates
+from routers import auth, dashboard, admin, metrics, health
 
-# Cargar configuración del entorno
-load_dotenv()
 logger = get_logger("FastAPI-App")
 
-# Crear la aplicación FastAPI
-app = FastAPI()
-
-
-# Middleware para capturar el User-Agent y almacenarlo en request.state.device
-@app.middleware("http")
-async def add_device_to_request(request: Request, call_next):
-    request.state.device = request.headers.get("User-Agent", "UnknownDevice")
-    response = await call_next(request)
-    return response
-
-# Middleware para capturar el ip de la solicitud y almacenarlo en request.state.ip
-@app.middleware("http")
-async def add_ip_to_request(request: Request, call_next):
-    request.state.ip = request.client.host
-    response = await call_next(request)
-    return response
-
-# Middleware de sesiones para mantener el estado (por ejemplo, token OAuth)
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.getenv("SESSION_SECRET_KEY"),
-    session_cookie="session",
-    max_age=3600,
-    same_site="lax"
-)
-
-# Servir archivos estáticos (CSS, imágenes, etc.)
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Incluir routers de la aplicación
-from routers import auth, dashboard, admin
-app.include_router(auth.router)
-app.include_router(dashboard.router)
-app.include_router(admin.router)
-
-# URL base de Authentik (desde .env)
-url = os.getenv("AUTHENTIK_URL")
-
-# Configuración del cliente OAuth con Authentik
-oauth = OAuth()
-oauth.register(
-    name='authentik',
-    client_id=os.getenv("AUTHENTIK_CLIENT_ID"),
-    client_secret=os.getenv("AUTHENTIK_CLIENT_SECRET"),
-    authorize_url=f'{url}/application/o/authorize/',
-    access_token_url=f'{url}/application/o/token/',
-    refresh_token_url=f'{url}/application/o/token/',
-    redirect_uri=os.getenv("AUTHENTIK_REDIRECT_URI"),
-    client_kwargs={'scope': 'openid profile email offline_access'},
-    jwks_uri=os.getenv("AUTHENTIK_JWKS_URL")
-)
-
-# Esquema OAuth2 para autorización con código
-oauth2_scheme = OAuth2AuthorizationCodeBearer(
-    authorizationUrl=f'{url}/application/o/authorize/',
-    tokenUrl=f'{url}/application/o/token/',
-)
-
-# Configuración de plantillas Jinja2
-templates = Jinja2Templates(directory="templates")
+
+async def _prefetch_jwks():
+    # Un único JWKS para la verificación de tokens y para validar el id_token del login
+    await jwks_cache.refresh()
+    oauth.authentik.server_metadata["jwks"] = jwks_cache.jwks
+
+
+# Ciclo de vida de la aplicación: antes de aceptar tráfico abre el pool de conexiones hacia
+# Authentik, descarga los metadatos OIDC y el JWKS, comprime los archivos estáticos y precompila
+# las plantillas; después inicia las tareas en segundo plano (índice de usuarios, refresco del
+# JWKS y medición del event loop)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await readiness.warmup({
+        "authentik_pool": authentik_client.startup,
+        "oidc_metadata": oauth.authentik.load_server_metadata,
+        "jwks": _prefetch_jwks,
+        "static_assets": static_assets.load,
+        "templates": lambda: precompile_templates(templates),
+    })
+    jwks_cache.start()
+    user_index.start()
+    loop_monitor.start()
+    yield
+    # /readyz deja de responder 200 para que el orquestador retire el worker
+    await readiness.stop()
+    await loop_monitor.stop()
+    await user_index.stop()
+    await jwks_cache.stop()
+    await authentik_client.shutdown()
+    audit_log.flush()
+    # Escribir los registros de log pendientes antes de terminar
+    shutdown_logging()
+
+
+def create_app() -> FastAPI:
+    """
+    Construye la aplicación FastAPI. Al importar los módulos solo se leen la configuración y se
+    crean los objetos compartidos (sin archivos, hilos ni red): la carpeta de logs, la caché de
+    plantillas y el hilo escritor se crean con el primer uso, el almacén de sesiones al construir
+    los middlewares y el trabajo de red y de precalentamiento ocurre en el lifespan.
+    Es el punto de entrada recomendado: `uvicorn main:create_app --factory`.
+    """
+    app = FastAPI(lifespan=lifespan)
+
+    # El cliente OAuth (metadatos OIDC, JWKS e intercambio del código en el login) envía sus
+    # peticiones por el pool compartido, con el circuit breaker, el plazo y las métricas de cada endpoint
+    oauth.authentik.client_kwargs["transport"] = AuthentikTransport(authentik_client)
+
+    # Middleware de sesiones para mantener el estado (por ejemplo, token OAuth).
+    # Los datos se guardan en el servidor (SESSION_BACKEND) y la cookie solo lleva el ID de sesión
+    app.add_middleware(
+        ServerSessionMiddleware,
+        secret_key=os.getenv("SESSION_SECRET_KEY"),
+        session_cookie="session",
+        max_age=3600,
+        same_site="lax"
+    )
+
+    # Middleware ASGI que captura dispositivo, IP e ID de petición para request.state y los logs
+    app.add_middleware(RequestContextMiddleware)
+
+    # Middleware ASGI que mide latencia, código de estado y peticiones en curso por ruta (/metrics)
+    # (se añade al final para que sea la capa más externa y cubra el tiempo de los demás middlewares)
+    app.add_middleware(MetricsMiddleware)
+
+    # Servir archivos estáticos (CSS, imágenes, etc.) con huella de contenido y variantes comprimidas
+    app.mount("/static", static_assets, name="static")
+
+    # Incluir routers de la aplicación
+    app.include_router(auth.router)
+    app.include_router(dashboard.router)
+    app.include_router(admin.router)
+    app.include_router(metrics.router)
+    app.include_router(health.router)
+    return app
+
+
+_app = None
+
+
+def __getattr__(name: str):
+    """
+    `main.app` (p. ej. `uvicorn main:app`) construye la aplicación al pedirla por primera vez y
+    reutiliza la misma después; importar main no crea ninguna, así que `--factory` no construye dos.
+    """
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,51 @@
+import time
+from services.metrics import http_requests_total, http_request_duration_seconds, http_requests_in_flight
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro que mide cada petición HTTP: duración, código de estado y peticiones
+    en curso. La etiqueta `route` es la plantilla de la ruta (p. ej. /admin/users), no la URL
+    concreta, para que el número de series no crezca con los parámetros; las peticiones que no
+    coinciden con ninguna ruta se agrupan como "unmatched".
+    """
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            # Correspondencia endpoint -> plantilla de ruta, construida en la primera petición
+            routes = {}
+            for route in getattr(scope.get("app"), "routes", []):
+                target = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                routes.setdefault(target, route.path)
+            self._routes = routes
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            method = scope["method"]
+            route = self._route_label(scope)
+            http_request_duration_seconds.observe(time.perf_counter() - start, method, route)
+            http_requests_total.inc(method, route, str(status))
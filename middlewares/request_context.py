@@ -0,0 +1,93 @@
+import os
+import re
+import uuid
+import ipaddress
+from loggers.logger import device_var, ip_var, user_var, request_id_var, sanitize_log_field
+
+# Proxies de confianza (IPs o redes CIDR separadas por comas) cuyo X-Forwarded-For se respeta
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
+# Solo se reutiliza un X-Request-ID entrante si tiene un formato seguro para los logs
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _parse_networks(value: str) -> list:
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if item:
+            networks.append(ipaddress.ip_network(item, strict=False))
+    return networks
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI puro que captura, una sola vez por petición, el dispositivo (User-Agent),
+    la IP del cliente (resolviendo X-Forwarded-For solo detrás de proxies de confianza) y un
+    ID de petición. Los deja en request.state y en los contextvars usados por el logger,
+    y devuelve el ID en la cabecera X-Request-ID.
+    """
+    def __init__(self, app, trusted_proxies: str = TRUSTED_PROXIES):
+        self.app = app
+        self.trusted = _parse_networks(trusted_proxies)
+
+    def _is_trusted(self, host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted)
+
+    def _client_ip(self, scope, forwarded_for: str) -> str:
+        client = scope.get("client")
+        ip = client[0] if client else "UnknownIP"
+        if forwarded_for and self._is_trusted(ip):
+            # Se recorre la cadena de derecha a izquierda hasta el primer salto no confiable
+            for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+                ip = hop
+                if not self._is_trusted(hop):
+                    break
+        return ip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        device = "UnknownDevice"
+        forwarded_for = ""
+        request_id = ""
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                # El User-Agent lo controla el cliente: no debe poder alterar los campos del log
+                device = sanitize_log_field(value.decode("latin-1"))
+            elif name == b"x-forwarded-for":
+                forwarded_for = value.decode("latin-1")
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1")
+        if not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        ip = sanitize_log_field(self._client_ip(scope, forwarded_for))
+
+        state = scope.setdefault("state", {})
+        state["device"] = device
+        state["ip"] = ip
+        state["request_id"] = request_id
+
+        tokens = (
+            device_var.set(device),
+            ip_var.set(ip),
+            user_var.set("Anonymous"),
+            request_id_var.set(request_id),
+        )
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            for var, token in zip((device_var, ip_var, user_var, request_id_var), tokens):
+                var.reset(token)
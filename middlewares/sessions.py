@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+from itsdangerous import Signer, BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.concurrency import run_in_threadpool
+
+# Backend de sesiones: "memory" (un solo proceso) o "sqlite" (compartido entre workers)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_MEMORY_MAX = int(os.getenv("SESSION_MEMORY_MAX", "10000"))
+
+
+class SessionData(dict):
+    """Diccionario de sesión que registra si fue modificado durante la petición."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.modified = False
+        self.regenerated = False
+
+    def regenerate(self):
+        """
+        Pide un identificador de sesión nuevo al responder, conservando los datos; el anterior se
+        elimina del almacén. Se usa al iniciar sesión para evitar la fijación de sesión.
+        """
+        self.regenerated = True
+        self.modified = True
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.modified = True
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        if self:
+            self.modified = True
+        super().clear()
+
+
+class MemorySessionStore:
+    """Almacén en memoria con expiración por TTL y desalojo LRU al superar `maxsize` sesiones."""
+    # Operaciones en memoria: se ejecutan directamente en el event loop
+    blocking = False
+
+    def __init__(self, maxsize: int = SESSION_MEMORY_MAX):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[session_id]
+            return None
+        self._entries.move_to_end(session_id)
+        return dict(data)
+
+    def set(self, session_id: str, data: dict, ttl: int):
+        self._entries[session_id] = (dict(data), time.time() + ttl)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, session_id: str):
+        self._entries.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    """
+    Almacén en un archivo SQLite local, compartido por todos los workers de la máquina.
+    Usa WAL para que las lecturas no bloqueen a las escrituras de otros procesos.
+    Las operaciones pueden esperar al bloqueo de escritura de otro worker (hasta `timeout`
+    segundos), así que el middleware las ejecuta en el threadpool; un lock serializa el uso
+    de la conexión compartida entre hilos.
+    """
+    PURGE_EVERY = 500
+    blocking = True
+
+    def __init__(self, path: str = SESSION_DB_PATH, timeout: float = 5):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, data: dict, ttl: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+def create_session_store(backend: str = SESSION_BACKEND):
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
+
+
+class ServerSessionMiddleware:
+    """
+    Sustituto de SessionMiddleware que guarda los datos de la sesión en el servidor.
+    La cookie solo contiene un identificador opaco (firmado con `secret_key` para descartar
+    identificadores falsificados sin consultar el almacén); el contenido se escribe en el
+    almacén únicamente cuando la sesión cambió durante la petición.
+    """
+    def __init__(
+        self,
+        app,
+        secret_key: str,
+        store=None,
+        session_cookie: str = "session",
+        max_age: int = 3600,
+        same_site: str = "lax",
+        https_only: bool = False,
+    ):
+        self.app = app
+        self.signer = Signer(secret_key)
+        self.store = store or create_session_store()
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.security_flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    async def _store_call(self, method, *args):
+        """Ejecuta una operación del almacén, en el threadpool si puede bloquear (SQLite)."""
+        if getattr(self.store, "blocking", False):
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    def _unsign(self, cookie: Optional[str]) -> Optional[str]:
+        if not cookie:
+            return None
+        try:
+            return self.signer.unsign(cookie).decode()
+        except BadSignature:
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        session_id = self._unsign(connection.cookies.get(self.session_cookie))
+        data = await self._store_call(self.store.get, session_id) if session_id else None
+        if data is None:
+            session_id = None
+        session = SessionData(data or {})
+        scope["session"] = session
+
+        async def send_wrapper(message):
+            nonlocal session_id
+            if message["type"] == "http.response.start" and session.modified:
+                headers = MutableHeaders(scope=message)
+                if session.regenerated and session_id:
+                    # El identificador anterior deja de ser válido; los datos pasan a uno nuevo
+                    await self._store_call(self.store.delete, session_id)
+                    session_id = None
+                if session:
+                    session_id = session_id or secrets.token_urlsafe(32)
+                    await self._store_call(self.store.set, session_id, dict(session), self.max_age)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}={self.signer.sign(session_id).decode()}; path=/; Max-Age={self.max_age}; {self.security_flags}",
+                    )
+                elif session_id:
+                    await self._store_call(self.store.delete, session_id)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
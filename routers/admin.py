@@ -1,116 +1,265 @@
-from fastapi import APIRouter, Request, HTTPException, Query, Form
-from fastapi.responses import RedirectResponse, HTMLResponse
-from math import ceil
+from fastapi import APIRouter, Request, HTTPException, Query, Form, Depends
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import io
 import os
-import requests
-import jwt
-from core import url, templates
+import re
+import csv
+import json
+import time
+import asyncio
+from typing import Optional
+from core import templates
+from services.authentik import authentik_client, AuthentikError, AuthentikUnavailable
+from services.cache import listing_cache
+from services.access_matrix import build_access_matrix
+from services.user_index import user_index
+from services.security import admin_claims
 from loggers.logger import get_logger
+from loggers.audit import audit_log, AuditQuery, LEVELS, parse_datetime
 
 # Crear una instancia del logger para el módulo de administración
 logger = get_logger("AdminModule")
 
-router = APIRouter(prefix="/admin")
+# Todas las rutas de administración verifican el token de la sesión una vez por petición
+# y solo las pueden usar los miembros de ADMIN_GROUPS (el resto recibe 403)
+router = APIRouter(prefix="/admin", dependencies=[Depends(admin_claims)])
 
-def get_logged_in_user(request: Request) -> str:
-    """
-    Devuelve el email del usuario autenticado desde el token almacenado en la sesión,
-    o "UnknownUser" si no se encuentra o ocurre un error.
-    """
-    token = request.session.get('token')
-    if token:
-        try:
-            decoded_token = jwt.decode(token, options={"verify_signature": False})
-            return decoded_token.get("preferred_username", "UnknownUser")
-        except Exception:
-            return "UnknownUser"
-    return "UnknownUser"
+# Tamaños de página permitidos en /admin/users y tamaño usado al exportar
+PAGE_SIZES = [10, 25, 50, 100]
+EXPORT_PAGE_SIZE = 100
+EXPORT_FIELDS = ["pk", "username", "name", "email", "is_active", "last_login", "groups"]
+# Creación masiva de scopes: máximo de elementos por lote y de POST simultáneos hacia Authentik
+SCOPES_PATH = "/api/v3/propertymappings/provider/scope/"
+BULK_SCOPE_MAX_ITEMS = int(os.getenv("BULK_SCOPE_MAX_ITEMS", "500"))
+BULK_SCOPE_CONCURRENCY = int(os.getenv("BULK_SCOPE_CONCURRENCY", "5"))
+SCOPE_FIELDS = ["name", "scope_name", "description", "expression"]
+# scope_name se envía en el parámetro `scope` de OAuth, separado por espacios
+_SCOPE_NAME = re.compile(r"^\S+$")
+
+
+def _upstream_error(e: AuthentikError, detail: str) -> HTTPException:
+    """Error HTTP para un fallo de Authentik: 503 si no responde y 502 si responde con error."""
+    return HTTPException(status_code=503 if isinstance(e, AuthentikUnavailable) else 502, detail=detail)
+
+async def _last_users_page(page_size: int) -> Optional[int]:
+    """Número de la última página de usuarios según la primera página, o None si no se puede obtener."""
+    try:
+        data, _ = await listing_cache.get_or_stale(
+            "users", (1, page_size),
+            lambda: authentik_client.get_json("/api/v3/core/users/", params={"page": 1, "page_size": page_size})
+        )
+    except AuthentikError:
+        return None
+    return max(1, data.get("pagination", {}).get("total_pages", 1))
 
 @router.get("/users", response_class=HTMLResponse)
-async def admin_users(request: Request, page: int = Query(1, ge=1)):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    token = request.session.get('token')
-    current_user = get_logged_in_user(request)
-    if not token:
-        logger.warning("Acceso a /admin/users sin token", extra={"device": device, "user": current_user, "ip": ip})
+async def admin_users(request: Request, page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100)):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/users sin token")
         return RedirectResponse(url="/")
-    headers = {"Authorization": f"Bearer {os.getenv('INTERNAL_TOKEN')}"}
-    response = requests.get(f"{url}/api/v3/core/users/", headers=headers)
-    if response.status_code != 200:
-        logger.error("Error al consultar usuarios", extra={"device": device, "user": current_user, "ip": ip})
-        raise HTTPException(status_code=response.status_code, detail="Error al consultar usuarios")
-    data = response.json()
-    all_users = data.get("results", [])
-    per_page = 10
-    total_pages = ceil(len(all_users) / per_page)
-    users_page = all_users[(page - 1) * per_page : page * per_page]
-    logger.info("Listado de usuarios obtenido", extra={"device": device, "user": current_user, "ip": ip})
+    # Solo se aceptan los tamaños que ofrece la página, para acotar las claves de la caché
+    if page_size not in PAGE_SIZES:
+        raise HTTPException(status_code=422, detail=f"page_size debe ser uno de {PAGE_SIZES}")
+    # La paginación se delega a Authentik: solo se descarga la página solicitada
+    try:
+        data, stale_age = await listing_cache.get_or_stale(
+            "users", (page, page_size),
+            lambda: authentik_client.get_json("/api/v3/core/users/", params={"page": page, "page_size": page_size})
+        )
+    except AuthentikError as e:
+        # Authentik responde 404 a una página fuera de rango (p. ej. un enlace antiguo después
+        # de borrar usuarios): se redirige a la última página en lugar de devolver un 502
+        if e.status_code == 404 and page > 1:
+            last_page = await _last_users_page(page_size)
+            if last_page is not None and last_page < page:
+                logger.info(f"Página {page} fuera de rango, redirigiendo a la página {last_page}")
+                return RedirectResponse(url=str(request.url.include_query_params(page=last_page)), status_code=303)
+        logger.error(f"Error al consultar usuarios: {e}")
+        raise _upstream_error(e, "Error al consultar usuarios")
+    pagination = data.get("pagination", {})
+    total_pages = pagination.get("total_pages", 1)
+    logger.info("Listado de usuarios obtenido")
     context = {
         "request": request,
-        "users": users_page,
+        "users": data.get("results", []),
         "prev_page": page - 1 if page > 1 else None,
         "next_page": page + 1 if page < total_pages else None,
-        "pages": list(range(1, total_pages + 1)),
-        "current_page": page
+        # Solo se muestran los enlaces cercanos a la página actual
+        "pages": list(range(max(1, page - 5), min(total_pages, page + 5) + 1)),
+        "current_page": page,
+        "total_pages": total_pages,
+        "total_users": pagination.get("count", 0),
+        "page_size": page_size,
+        "page_sizes": PAGE_SIZES,
+        # Versión de los datos: clave del fragmento cacheado de la tabla
+        "data_version": listing_cache.version("users", (page, page_size)) or None,
+        # Antigüedad del dato si Authentik falló y se muestra la última copia válida
+        "stale_age": stale_age,
     }
     return templates.TemplateResponse("users.html", context)
 
+@router.get("/users/search")
+async def search_users(request: Request, q: str = Query("", max_length=100), limit: int = Query(10, ge=1, le=50)):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/users/search sin token")
+        raise HTTPException(status_code=401, detail="Token no encontrado en la sesión")
+    # Consulta servida íntegramente desde el índice en memoria, sin llamar a Authentik
+    return JSONResponse({"ready": user_index.ready, "results": user_index.search(q, limit)})
+
+def _export_row(user: dict) -> dict:
+    """Reduce un usuario de Authentik a los campos exportados."""
+    row = {field: user.get(field) for field in EXPORT_FIELDS}
+    row["groups"] = ";".join(group.get("name", "") for group in user.get("groups_obj") or [])
+    return row
+
+async def _stream_users(first_page: dict, pages, fmt: str):
+    """
+    Generador que emite los usuarios página a página, en CSV o NDJSON,
+    sin mantener el listado completo en memoria.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    data = first_page
+    while data is not None:
+        if fmt == "csv":
+            for user in data.get("results", []):
+                writer.writerow(_export_row(user))
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(json.dumps(_export_row(user), ensure_ascii=False) + "\n" for user in data.get("results", []))
+        yield chunk
+        try:
+            data = await pages.__anext__()
+        except StopAsyncIteration:
+            data = None
+        except AuthentikError as e:
+            # Las cabeceras ya se enviaron con 200: en lugar de cerrar la respuesta como si el
+            # listado estuviera completo se relanza la excepción, que corta la transferencia
+            # sin el fragmento final. En NDJSON se emite antes una línea de error reconocible.
+            logger.error(f"Exportación de usuarios interrumpida: {e}")
+            if fmt != "csv":
+                yield json.dumps({"error": "Exportación interrumpida", "detail": str(e)}, ensure_ascii=False) + "\n"
+            raise
+
+@router.get("/users/export")
+async def export_users(request: Request, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/users/export sin token")
+        return RedirectResponse(url="/")
+    pages = authentik_client.iter_pages("/api/v3/core/users/", page_size=EXPORT_PAGE_SIZE)
+    # La primera página se consulta antes de responder para poder devolver un error HTTP
+    try:
+        first_page = await pages.__anext__()
+    except AuthentikError as e:
+        logger.error(f"Error al exportar usuarios: {e}")
+        raise _upstream_error(e, "Error al exportar usuarios")
+    logger.info(f"Exportación de usuarios en formato {format}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"usuarios.{format}"
+    return StreamingResponse(
+        _stream_users(first_page, pages, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/groups", response_class=HTMLResponse)
 async def admin_groups(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    token = request.session.get('token')
-    current_user = get_logged_in_user(request)
-    if not token:
-        logger.warning("Acceso a /admin/groups sin token", extra={"device": device, "user": current_user, "ip": ip})
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/groups sin token")
         return RedirectResponse(url="/")
-    headers = {"Authorization": f"Bearer {os.getenv('INTERNAL_TOKEN')}"}
-    response = requests.get(f"{url}/api/v3/core/groups/", headers=headers)
-    if response.status_code != 200:
-        logger.error("Error al consultar grupos", extra={"device": device, "user": current_user, "ip": ip})
-        raise HTTPException(status_code=response.status_code, detail="Error al consultar grupos")
-    groups = response.json().get("results", [])
-    logger.info("Listado de grupos obtenido", extra={"device": device, "user": current_user, "ip": ip})
-    return templates.TemplateResponse("groups.html", {"request": request, "groups": groups})
+    try:
+        data, stale_age = await listing_cache.get_or_stale("groups", None, lambda: authentik_client.get_json("/api/v3/core/groups/"))
+    except AuthentikError as e:
+        logger.error(f"Error al consultar grupos: {e}")
+        raise _upstream_error(e, "Error al consultar grupos")
+    groups = data.get("results", [])
+    logger.info("Listado de grupos obtenido")
+    context = {
+        "request": request,
+        "groups": groups,
+        "data_version": listing_cache.version("groups") or None,
+        "stale_age": stale_age,
+    }
+    return templates.TemplateResponse("groups.html", context)
 
 @router.get("/roles", response_class=HTMLResponse)
 async def admin_roles(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    token = request.session.get('token')
-    current_user = get_logged_in_user(request)
-    if not token:
-        logger.warning("Acceso a /admin/roles sin token", extra={"device": device, "user": current_user, "ip": ip})
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/roles sin token")
+        return RedirectResponse(url="/")
+    try:
+        data, stale_age = await listing_cache.get_or_stale("roles", None, lambda: authentik_client.get_json("/api/v3/rbac/roles/"))
+    except AuthentikError as e:
+        logger.error(f"Error al consultar roles: {e}")
+        raise _upstream_error(e, "Error al consultar roles")
+    roles = data.get("results", [])
+    logger.info("Listado de roles obtenido")
+    context = {
+        "request": request,
+        "roles": roles,
+        "data_version": listing_cache.version("roles") or None,
+        "stale_age": stale_age,
+    }
+    return templates.TemplateResponse("roles.html", context)
+
+@router.get("/access", response_class=HTMLResponse)
+async def admin_access(request: Request, group: str = Query("", max_length=100), role: str = Query("", max_length=100)):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/access sin token")
         return RedirectResponse(url="/")
-    headers = {"Authorization": f"Bearer {os.getenv('INTERNAL_TOKEN')}"}
-    response = requests.get(f"{url}/api/v3/rbac/roles/", headers=headers)
-    if response.status_code != 200:
-        logger.error("Error al consultar roles", extra={"device": device, "user": current_user, "ip": ip})
-        raise HTTPException(status_code=response.status_code, detail="Error al consultar roles")
-    roles = response.json().get("results", [])
-    logger.info("Listado de roles obtenido", extra={"device": device, "user": current_user, "ip": ip})
-    return templates.TemplateResponse("roles.html", {"request": request, "roles": roles})
+    # La matriz completa se cachea; los filtros se aplican en memoria sobre ella
+    try:
+        matrix, stale_age = await listing_cache.get_or_stale("access", None, build_access_matrix)
+    except AuthentikError as e:
+        logger.error(f"Error al construir la matriz de accesos: {e}")
+        raise _upstream_error(e, "Error al consultar grupos y roles")
+    rows = matrix.rows(group or None, role or None)
+    logger.info(f"Matriz de accesos obtenida: {len(rows)} usuarios")
+    context = {
+        "request": request,
+        "rows": rows,
+        "summary": matrix.summary(),
+        "groups": sorted(matrix.groups.items(), key=lambda item: item[1].lower()),
+        "roles": sorted(matrix.roles.items(), key=lambda item: item[1].lower()),
+        "filters": {"group": group, "role": role},
+        "data_version": listing_cache.version("access") or None,
+        "stale_age": stale_age,
+    }
+    return templates.TemplateResponse("access.html", context)
 
 @router.get("/scopes", response_class=HTMLResponse)
 async def admin_scopes(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    token = request.session.get('token')
-    current_user = get_logged_in_user(request)
-    if not token:
-        logger.warning("Acceso a /admin/scopes sin token", extra={"device": device, "user": current_user, "ip": ip})
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/scopes sin token")
         return RedirectResponse(url="/")
-    headers = {"Authorization": f"Bearer {os.getenv('INTERNAL_TOKEN')}"}
-    response = requests.get(f"{url}/api/v3/propertymappings/provider/scope/", headers=headers)
     try:
-        data = response.json() if response.text.strip() else {}
-    except Exception as e:
-        logger.error(f"Error al decodificar JSON en scopes: {e}", extra={"device": device, "user": current_user, "ip": ip})
-        data = {}
+        data, stale_age = await listing_cache.get_or_stale(
+            "scopes", None, lambda: authentik_client.get_json(SCOPES_PATH)
+        )
+    except AuthentikError as e:
+        logger.error(f"Error al consultar scopes: {e}")
+        raise _upstream_error(e, "Error al consultar scopes")
     scopes = data.get("results", [])
-    logger.info("Listado de scopes obtenido", extra={"device": device, "user": current_user, "ip": ip})
-    return templates.TemplateResponse("create_scope.html", {"request": request, "scopes": scopes})
+    logger.info("Listado de scopes obtenido")
+    context = {
+        "request": request,
+        "scopes": scopes,
+        "data_version": listing_cache.version("scopes") or None,
+        "stale_age": stale_age,
+    }
+    return templates.TemplateResponse("create_scope.html", context)
 
 @router.post("/scopes")
 async def create_scope(
@@ -120,12 +269,9 @@ async def create_scope(
     description: str = Form(...),
     expression: str = Form(...)
 ):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    token = request.session.get('token')
-    current_user = get_logged_in_user(request)
-    if not token:
-        logger.warning("Intento de crear scope sin token", extra={"device": device, "user": current_user, "ip": ip})
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Intento de crear scope sin token")
         return RedirectResponse(url="/")
     scope_data = {
         "name": mapping_name,
@@ -133,10 +279,212 @@ async def create_scope(
         "description": description,
         "expression": expression
     }
-    headers = {"Authorization": f"Bearer {os.getenv('INTERNAL_TOKEN')}"}
-    response = requests.post(f"{url}/api/v3/propertymappings/provider/scope/", headers=headers, json=scope_data)
+    try:
+        response = await authentik_client.post(SCOPES_PATH, api=True, json=scope_data)
+    except AuthentikError as e:
+        logger.error(f"Error al crear scope: {e}")
+        raise _upstream_error(e, "Error al crear scope")
     if response.status_code != 201:
-        logger.error("Error al crear scope", extra={"device": device, "user": current_user, "ip": ip})
+        logger.error("Error al crear scope")
         raise HTTPException(status_code=response.status_code, detail="Error al crear scope")
-    logger.info("Scope creado correctamente", extra={"device": device, "user": current_user, "ip": ip})
-    return RedirectResponse(url="/admin/scopes", status_code=303)
\ No newline at end of file
+    # El listado de scopes cambió: se descarta la copia en caché
+    listing_cache.invalidate("scopes")
+    logger.info("Scope creado correctamente")
+    return RedirectResponse(url="/admin/scopes", status_code=303)
+
+def _decode_batch(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El lote debe estar codificado en UTF-8")
+
+
+async def _read_scope_batch(request: Request) -> list:
+    """Lee el lote de scopes del cuerpo: JSON (lista u objeto con "items"), CSV o archivo subido."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Falta el archivo del lote")
+        raw = _decode_batch(await upload.read())
+        is_json = (upload.filename or "").lower().endswith(".json")
+    else:
+        raw = _decode_batch(await request.body())
+        is_json = "json" in content_type
+    if is_json:
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Se esperaba una lista de scopes")
+        return items
+    try:
+        return list(csv.DictReader(io.StringIO(raw)))
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {e}")
+
+
+def _validate_scope_batch(items: list) -> list:
+    """Valida todo el lote antes de crear nada; devuelve la lista de errores por elemento."""
+    errors = []
+    seen = set()
+    seen_names = set()
+    if not items:
+        errors.append({"index": None, "detail": "El lote está vacío"})
+    if len(items) > BULK_SCOPE_MAX_ITEMS:
+        errors.append({"index": None, "detail": f"El lote supera el máximo de {BULK_SCOPE_MAX_ITEMS} scopes"})
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "detail": "Elemento inválido"})
+            continue
+        for field in ("name", "scope_name", "expression"):
+            if not str(item.get(field) or "").strip():
+                errors.append({"index": index, "detail": f"Falta el campo '{field}'"})
+        scope_name = str(item.get("scope_name") or "").strip()
+        if scope_name and not _SCOPE_NAME.match(scope_name):
+            errors.append({"index": index, "detail": f"scope_name inválido: '{scope_name}'"})
+        if scope_name in seen:
+            errors.append({"index": index, "detail": f"scope_name repetido en el lote: '{scope_name}'"})
+        seen.add(scope_name)
+        # Authentik exige que el nombre del mapping sea único: dos filas con el mismo nombre se
+        # enviarían a la vez y la segunda se daría por existente aunque su contenido sea distinto
+        name = str(item.get("name") or "").strip()
+        if name and name in seen_names:
+            errors.append({"index": index, "detail": f"name repetido en el lote: '{name}'"})
+        seen_names.add(name)
+    return errors
+
+
+async def _create_scope_item(
+    index: int, item: dict, existing_scope_names: set, existing_names: set, semaphore: asyncio.Semaphore
+) -> dict:
+    scope_data = {field: str(item.get(field) or "").strip() for field in SCOPE_FIELDS}
+    result = {"index": index, "name": scope_data["name"], "scope_name": scope_data["scope_name"]}
+    # Cada campo se compara solo con el mismo campo de los mappings existentes
+    if scope_data["scope_name"] in existing_scope_names or scope_data["name"] in existing_names:
+        return {**result, "status": "exists"}
+    async with semaphore:
+        try:
+            response = await authentik_client.post(SCOPES_PATH, api=True, json=scope_data)
+        except AuthentikError as e:
+            return {**result, "status": "failed", "detail": str(e)}
+    if response.status_code == 201:
+        return {**result, "status": "created"}
+    if response.status_code == 400 and "already exists" in response.text.lower():
+        return {**result, "status": "exists"}
+    return {**result, "status": "failed", "detail": f"Authentik respondió {response.status_code}: {response.text[:200]}"}
+
+
+@router.post("/scopes/bulk")
+async def create_scopes_bulk(request: Request):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Intento de crear scopes en lote sin token")
+        raise HTTPException(status_code=401, detail="Token no encontrado en la sesión")
+    items = await _read_scope_batch(request)
+    errors = _validate_scope_batch(items)
+    if errors:
+        logger.warning(f"Lote de scopes rechazado: {len(errors)} errores de validación")
+        return JSONResponse({"detail": "Lote inválido, no se creó ningún scope", "errors": errors}, status_code=422)
+    # Los scopes que ya existen se detectan antes de enviar los POST
+    existing_scope_names = set()
+    existing_names = set()
+    try:
+        async for page in authentik_client.iter_pages(SCOPES_PATH):
+            for scope in page.get("results", []):
+                existing_scope_names.add(scope.get("scope_name"))
+                existing_names.add(scope.get("name"))
+    except AuthentikError as e:
+        logger.error(f"Error al consultar scopes existentes: {e}")
+        raise _upstream_error(e, "Error al consultar scopes existentes")
+    semaphore = asyncio.Semaphore(BULK_SCOPE_CONCURRENCY)
+    results = await asyncio.gather(*[
+        _create_scope_item(index, item, existing_scope_names, existing_names, semaphore)
+        for index, item in enumerate(items)
+    ])
+    summary = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "exists", "failed")}
+    if summary["created"]:
+        listing_cache.invalidate("scopes")
+    logger.info(f"Creación masiva de scopes: {summary}")
+    return JSONResponse({"summary": summary, "results": results})
+
+def _audit_query(since: str, until: str, level: str, user: str, ip: str, func: str, text: str) -> AuditQuery:
+    """Filtros de la vista de auditoría; por defecto, las últimas 24 horas."""
+    try:
+        since_ts = parse_datetime(since) if since else time.time() - 86400
+        until_ts = parse_datetime(until) if until else time.time() + 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+    return AuditQuery(since_ts, until_ts, level or None, user, ip, func, text)
+
+@router.get("/audit", response_class=HTMLResponse)
+async def admin_audit(
+    request: Request,
+    since: str = Query(""),
+    until: str = Query(""),
+    level: str = Query(""),
+    user: str = Query(""),
+    ip: str = Query(""),
+    func: str = Query(""),
+    text: str = Query(""),
+    cursor: str = Query("", pattern=r"^(\d+:\d+)?$"),
+    limit: int = Query(100, ge=1, le=500),
+):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/audit sin token")
+        return RedirectResponse(url="/")
+    query = _audit_query(since, until, level, user, ip, func, text)
+    # La lectura de los logs se hace en un hilo para no bloquear el event loop
+    records, next_cursor = await run_in_threadpool(audit_log.page, query, cursor or None, limit)
+    logger.info(f"Consulta de auditoría: {len(records)} registros")
+    context = {
+        "request": request,
+        "records": records,
+        "filters": {"since": since, "until": until, "level": level, "user": user, "ip": ip, "func": func, "text": text},
+        "levels": LEVELS,
+        "next_url": str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+        "export_url": str(request.url.replace(path="/admin/audit/export").remove_query_params(["cursor", "limit"])),
+    }
+    return templates.TemplateResponse("audit.html", context)
+
+@router.get("/audit/export")
+async def export_audit(
+    request: Request,
+    since: str = Query(""),
+    until: str = Query(""),
+    level: str = Query(""),
+    user: str = Query(""),
+    ip: str = Query(""),
+    func: str = Query(""),
+    text: str = Query(""),
+):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/audit/export sin token")
+        return RedirectResponse(url="/")
+    query = _audit_query(since, until, level, user, ip, func, text)
+    logger.info("Exportación de auditoría")
+
+    def stream():
+        # Generador síncrono: Starlette lo recorre en un hilo, registro a registro
+        for record, _ in audit_log.scan(query):
+            record = {key: value for key, value in record.items() if key != "ts"}
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="auditoria.ndjson"'}
+    )
+
+@router.get("/cache/stats")
+async def cache_stats(request: Request):
+    claims = request.state.claims
+    if not claims:
+        logger.warning("Acceso a /admin/cache/stats sin token")
+        raise HTTPException(status_code=401, detail="Token no encontrado en la sesión")
+    return JSONResponse(listing_cache.stats())
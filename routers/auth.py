@@ -3,6 +3,8 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 import secrets
 import os
 from core import oauth, templates
+from services.token_manager import store_token
+from services.authentik import AuthentikUnavailable
 from loggers.logger import get_logger
 
 # Crear una instancia del logger para el módulo de autenticación
@@ -12,52 +14,55 @@ router = APIRouter()
 
 @router.get("/", response_class=HTMLResponse)
 def root(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
-    logger.info("Mostrando página de login", extra={"device": device, "user": "Anonymous", "ip": ip, "custom_func": "HomePage"})
+    logger.info("Mostrando página de login", extra={"custom_func": "HomePage"})
     return templates.TemplateResponse("login.html", {"request": request})
 
 @router.get("/oauth/authorize")
 async def oauth_authorize(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
     state = secrets.token_urlsafe(16)
     request.session["oauth_state"] = state
     redirect_uri = os.getenv("AUTHENTIK_REDIRECT_URI")
-    logger.info("Iniciando flujo OAuth", extra={"device": device, "user": "Anonymous", "ip": ip})
-    return await oauth.authentik.authorize_redirect(request, redirect_uri, state=state)
+    logger.info("Iniciando flujo OAuth")
+    try:
+        return await oauth.authentik.authorize_redirect(request, redirect_uri, state=state)
+    except AuthentikUnavailable as e:
+        # Los metadatos OIDC se descargan aquí si no se pudieron obtener al arrancar
+        logger.error(f"Authentik no disponible al iniciar el login: {e}")
+        raise HTTPException(status_code=503, detail="Authentik no disponible")
 
 @router.get("/oauth/callback")
 async def oauth_callback(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
     expected_state = request.session.get("oauth_state")
     received_state = request.query_params.get("state")
     if not expected_state or expected_state != received_state:
-        logger.error("State parameter mismatch in callback", extra={"device": device, "user": "Anonymous", "ip": ip})
+        logger.error("State parameter mismatch in callback")
         raise HTTPException(status_code=400, detail="Mismatching state parameter.")
     request.session.pop("oauth_state", None)
-    token_data = await oauth.authentik.authorize_access_token(request)
+    try:
+        token_data = await oauth.authentik.authorize_access_token(request)
+    except AuthentikUnavailable as e:
+        # Circuito abierto, plazo agotado o error de conexión: se falla rápido en lugar de esperar
+        logger.error(f"Authentik no disponible al canjear el código: {e}")
+        raise HTTPException(status_code=503, detail="Authentik no disponible")
     access_token = token_data.get("access_token")
     if not access_token:
-        logger.error("No se recibió el access token", extra={"device": device, "user": "Anonymous", "ip": ip})
+        logger.error("No se recibió el access token")
         raise HTTPException(status_code=400, detail="No se recibió el access token")
-    request.session["token"] = access_token
-    logger.info("Access token recibido y almacenado en sesión", extra={"device": device, "user": "AuthenticatedUser", "ip": ip})
+    # Se conserva también el refresh token para renovar el access token sin repetir el login
+    store_token(request.session, token_data)
+    # Nuevo ID de sesión tras autenticarse: el emitido antes del login (con oauth_state) se descarta
+    request.session.regenerate()
+    logger.info("Access token recibido y almacenado en sesión")
     return RedirectResponse(url="/dashboard")
 
 @router.get("/logout")
 async def logout(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
     request.session.clear()
-    logger.info("Cierre de sesión local", extra={"device": device, "user": "Anonymous", "ip": ip})
+    logger.info("Cierre de sesión local")
     return RedirectResponse(url="/")
 
 @router.get("/logout-authentik")
 async def logout_authentik(request: Request):
-    device = getattr(request.state, "device", "UnknownDevice")
-    ip = getattr(request.state, "ip", "UnknownIP")
     request.session.clear()
-    logger.info("Cierre de sesión en Authentik", extra={"device": device, "user": "Anonymous", "ip": ip})
+    logger.info("Cierre de sesión en Authentik")
     return RedirectResponse(url=os.getenv("AUTHENTIK_LOGOUT_URL"))
\ No newline at end of file
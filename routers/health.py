@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.readiness import readiness
+from services.user_index import user_index
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    # Liveness: el proceso responde; no depende de Authentik
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    # Readiness: 200 solo cuando el precalentamiento terminó y el worker no se está deteniendo
+    status = readiness.status()
+    status["user_index"] = user_index.ready
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
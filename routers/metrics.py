@@ -0,0 +1,58 @@
+import os
+import secrets
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+from core import templates
+from services.cache import listing_cache
+from services.metrics import registry
+from loggers.logger import get_log_stats
+
+# Token opcional para proteger /metrics (el scraper lo envía como "Authorization: Bearer <token>")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter()
+
+
+def _listing_cache_metrics() -> list:
+    stats = listing_cache.stats()
+    events = {}
+    entries = {}
+    for resource, counters in stats.items():
+        for event in ("hits", "stale_hits", "misses", "coalesced", "refreshes", "errors", "stale_errors"):
+            events[(("resource", resource), ("event", event))] = counters.get(event, 0)
+        entries[(("resource", resource),)] = counters["entries"]
+    return [
+        ("listing_cache_events_total", "counter", "Eventos de la caché de listados", events),
+        ("listing_cache_entries", "gauge", "Entradas en la caché de listados", entries),
+    ]
+
+
+def _fragment_cache_metrics() -> list:
+    cache = templates.env.fragment_cache
+    return [
+        ("fragment_cache_hits_total", "counter", "Fragmentos de plantilla servidos desde la caché", {(): cache.hits}),
+        ("fragment_cache_misses_total", "counter", "Fragmentos de plantilla renderizados", {(): cache.misses}),
+    ]
+
+
+def _log_metrics() -> list:
+    stats = get_log_stats()
+    return [
+        ("log_queue_size", "gauge", "Registros de log pendientes de escribir", {(): stats["queued"]}),
+        ("log_records_dropped_total", "counter", "Registros de log descartados con la cola llena", {(): stats["dropped"]}),
+        ("log_records_written_total", "counter", "Registros de log escritos", {(): stats["written"]}),
+    ]
+
+
+registry.register_collector(_listing_cache_metrics)
+registry.register_collector(_fragment_cache_metrics)
+registry.register_collector(_log_metrics)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    if METRICS_TOKEN:
+        authorization = request.headers.get("authorization", "")
+        if not secrets.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,147 @@
+import os
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+from services.authentik import authentik_client
+from loggers.logger import get_logger
+
+logger = get_logger("AccessMatrixModule")
+
+# Consultas simultáneas de miembros de grupos hacia Authentik al construir la matriz
+ACCESS_MATRIX_CONCURRENCY = int(os.getenv("ACCESS_MATRIX_CONCURRENCY", "5"))
+ACCESS_MATRIX_PAGE_SIZE = 100
+
+USERS_PATH = "/api/v3/core/users/"
+GROUPS_PATH = "/api/v3/core/groups/"
+ROLES_PATH = "/api/v3/rbac/roles/"
+
+
+class AccessMatrix:
+    """
+    Vista usuario × grupo × rol construida con índices compactos:
+    - usuarios (pk -> tupla de campos), grupos y roles (pk -> nombre);
+    - miembros de cada grupo y roles asignados a cada grupo (pk -> conjunto de pks);
+    - los índices inversos (grupos de cada usuario, grupos que conceden cada rol) se
+      derivan al construirla, así que cada filtro se resuelve con uniones e intersecciones
+      de conjuntos sin volver a consultar Authentik.
+    Solo aparecen los usuarios que pertenecen al menos a un grupo.
+    """
+    def __init__(
+        self,
+        users: Dict[int, Tuple[str, str, str, bool]],
+        groups: Dict[str, str],
+        roles: Dict[str, str],
+        group_members: Dict[str, Set[int]],
+        group_roles: Dict[str, Set[str]],
+    ):
+        self.users = users
+        self.groups = groups
+        self.roles = roles
+        self.group_members = group_members
+        self.group_roles = group_roles
+        self.user_groups: Dict[int, Set[str]] = {}
+        for group_pk, members in group_members.items():
+            for user_pk in members:
+                self.user_groups.setdefault(user_pk, set()).add(group_pk)
+        self.role_groups: Dict[str, Set[str]] = {}
+        for group_pk, role_pks in group_roles.items():
+            for role_pk in role_pks:
+                self.role_groups.setdefault(role_pk, set()).add(group_pk)
+
+    def members_with_role(self, role_pk: str) -> Set[int]:
+        """Usuarios que reciben el rol a través de alguno de sus grupos."""
+        members: Set[int] = set()
+        for group_pk in self.role_groups.get(role_pk, ()):
+            members |= self.group_members.get(group_pk, set())
+        return members
+
+    def rows(self, group_pk: Optional[str] = None, role_pk: Optional[str] = None) -> List[dict]:
+        """Filas de la matriz, ordenadas por username y filtradas por grupo y/o rol."""
+        selected = set(self.user_groups)
+        if group_pk:
+            selected &= self.group_members.get(group_pk, set())
+        if role_pk:
+            selected &= self.members_with_role(role_pk)
+        rows = []
+        for user_pk in selected:
+            username, name, email, is_active = self.users[user_pk]
+            group_pks = self.user_groups[user_pk]
+            role_pks = set()
+            for pk in group_pks:
+                role_pks |= self.group_roles.get(pk, set())
+            rows.append({
+                "pk": user_pk,
+                "username": username,
+                "name": name,
+                "email": email,
+                "is_active": is_active,
+                "groups": sorted(self.groups[pk] for pk in group_pks),
+                "roles": sorted(self.roles.get(pk, pk) for pk in role_pks),
+            })
+        rows.sort(key=lambda row: row["username"].lower())
+        return rows
+
+    def summary(self) -> dict:
+        return {"users": len(self.user_groups), "groups": len(self.groups), "roles": len(self.roles)}
+
+
+async def _fetch_all(path: str, params: Optional[dict] = None) -> list:
+    results = []
+    async for data in authentik_client.iter_pages(path, page_size=ACCESS_MATRIX_PAGE_SIZE, params=params):
+        results.extend(data.get("results", []))
+    return results
+
+
+async def _gather_or_cancel(*aws):
+    """Como asyncio.gather, pero si una consulta falla cancela las que siguen en curso."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def build_access_matrix() -> AccessMatrix:
+    """
+    Obtiene de Authentik los grupos (con sus roles) y los roles en paralelo, y después los
+    miembros de cada grupo con un máximo de ACCESS_MATRIX_CONCURRENCY consultas simultáneas,
+    en lugar de una consulta por usuario.
+    """
+    # Los miembros se piden aparte, así que el listado de grupos no los incrusta (include_users)
+    groups, roles = await _gather_or_cancel(
+        _fetch_all(GROUPS_PATH, {"include_users": "false"}),
+        _fetch_all(ROLES_PATH),
+    )
+    semaphore = asyncio.Semaphore(ACCESS_MATRIX_CONCURRENCY)
+
+    async def fetch_members(group_pk: str) -> list:
+        async with semaphore:
+            return await _fetch_all(USERS_PATH, {"groups_by_pk": group_pk})
+
+    memberships = await _gather_or_cancel(*[fetch_members(group["pk"]) for group in groups])
+
+    role_names = {role["pk"]: role.get("name", "") for role in roles}
+    users: Dict[int, Tuple[str, str, str, bool]] = {}
+    group_members: Dict[str, Set[int]] = {}
+    group_roles: Dict[str, Set[str]] = {}
+    for group, members in zip(groups, memberships):
+        group_members[group["pk"]] = {user["pk"] for user in members}
+        for user in members:
+            if user["pk"] not in users:
+                users[user["pk"]] = (
+                    user.get("username") or "", user.get("name") or "", user.get("email") or "", bool(user.get("is_active")),
+                )
+        group_roles[group["pk"]] = set(group.get("roles") or [])
+        # Roles asignados que no aparecen en el listado (p. ej. sin permiso para verlos)
+        for role in group.get("roles_obj") or []:
+            role_names.setdefault(role["pk"], role.get("name", ""))
+    matrix = AccessMatrix(
+        users,
+        {group["pk"]: group.get("name", "") for group in groups},
+        role_names,
+        group_members,
+        group_roles,
+    )
+    logger.info(f"Matriz de accesos construida: {matrix.summary()}")
+    return matrix
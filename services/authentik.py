@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import asyncio
+import httpx
+from typing import Dict, Optional
+from core import url
+from services.metrics import (
+    authentik_requests_total,
+    authentik_request_duration_seconds,
+    authentik_request_errors_total,
+    authentik_request_retries_total,
+    authentik_requests_in_flight,
+    authentik_circuit_state,
+)
+from services.resilience import CircuitBreaker, RetryBudget, backoff_delay
+
+# Parámetros del pool de conexiones hacia Authentik (configurables desde .env)
+CONNECT_TIMEOUT = float(os.getenv("AUTHENTIK_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AUTHENTIK_READ_TIMEOUT", "15"))
+MAX_CONNECTIONS = int(os.getenv("AUTHENTIK_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("AUTHENTIK_MAX_KEEPALIVE", "10"))
+MAX_CONCURRENCY = int(os.getenv("AUTHENTIK_MAX_CONCURRENCY", "10"))
+# Tiempo máximo total de cada llamada (espera en la cola, reintentos y backoff incluidos)
+REQUEST_DEADLINE = float(os.getenv("AUTHENTIK_DEADLINE", "10"))
+# Reintentos de los GET ante errores de conexión o 502/503/504, con backoff exponencial y jitter
+MAX_RETRIES = int(os.getenv("AUTHENTIK_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("AUTHENTIK_RETRY_BACKOFF", "0.2"))
+RETRY_STATUSES = {502, 503, 504}
+# Fallos seguidos que abren el circuito de un endpoint y segundos hasta la llamada de prueba
+BREAKER_THRESHOLD = int(os.getenv("AUTHENTIK_BREAKER_THRESHOLD", "5"))
+BREAKER_RECOVERY = float(os.getenv("AUTHENTIK_BREAKER_RECOVERY", "30"))
+
+# Segmentos de ruta variables (IDs numéricos o UUID) que se agrupan en las métricas
+_ID_SEGMENT = re.compile(r"/(\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+
+
+def _endpoint_label(path: str) -> str:
+    """Ruta sin host ni identificadores, para usarla como etiqueta de las métricas."""
+    return _ID_SEGMENT.sub("/{id}", httpx.URL(path).path)
+
+
+class AuthentikError(Exception):
+    """Error devuelto por la API de Authentik (código distinto al esperado o respuesta no JSON)."""
+    def __init__(self, status_code: int, detail: str = ""):
+        super().__init__(detail or f"Authentik respondió con código {status_code}")
+        self.status_code = status_code
+
+
+class AuthentikUnavailable(AuthentikError):
+    """Authentik no respondió: error de conexión, plazo agotado o circuito abierto."""
+
+
+class AuthentikClient:
+    """
+    Cliente asíncrono compartido para la API de Authentik.
+    Mantiene un pool de conexiones keep-alive, aplica timeouts de conexión/lectura
+    y limita el número de peticiones simultáneas hacia el servidor.
+    Cada llamada tiene un plazo total (REQUEST_DEADLINE) y pasa por el circuit breaker de su
+    endpoint; los GET se reintentan dentro de un presupuesto de reintentos compartido.
+    Los errores de red se lanzan como AuthentikUnavailable.
+    El token interno (INTERNAL_TOKEN) solo se envía en las llamadas con `api=True`: el mismo
+    pool atiende también endpoints públicos (JWKS, token OAuth) que no deben recibirlo.
+    """
+    def __init__(self, base_url: str, token: Optional[str] = None):
+        self.base_url = base_url
+        self.token = token
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retry_budget = RetryBudget()
+
+    async def startup(self):
+        """Abre el pool de conexiones. Se invoca al arrancar la aplicación."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url or "",
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+        )
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def shutdown(self):
+        """Cierra el pool de conexiones. Se invoca al detener la aplicación."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RECOVERY)
+        return breaker
+
+    async def request(self, method: str, path: str, api: bool = False, **kwargs) -> httpx.Response:
+        if self._client is None:
+            await self.startup()
+        if api and self.token:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "Authorization": f"Bearer {self.token}"}
+        endpoint = _endpoint_label(path)
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            authentik_request_errors_total.inc(method, endpoint, "circuit_open")
+            raise AuthentikUnavailable(503, f"Circuito abierto para {endpoint} (reintento en {breaker.retry_after():.0f} s)")
+        self._retry_budget.deposit()
+        try:
+            response = await asyncio.wait_for(self._send_with_retries(method, path, endpoint, kwargs), REQUEST_DEADLINE)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+        except asyncio.TimeoutError as e:
+            breaker.record_failure()
+            authentik_request_errors_total.inc(method, endpoint, "deadline")
+            raise AuthentikUnavailable(504, f"Authentik no respondió en {REQUEST_DEADLINE:g} s") from e
+        except httpx.HTTPError as e:
+            breaker.record_failure()
+            raise AuthentikUnavailable(502, f"Error de conexión con Authentik: {e}") from e
+        except BaseException:
+            # Llamada cancelada por el cliente: no cuenta como fallo de Authentik
+            breaker.release()
+            raise
+        finally:
+            authentik_circuit_state.set(breaker.state, endpoint)
+
+    async def _send_with_retries(self, method: str, path: str, endpoint: str, kwargs: dict) -> httpx.Response:
+        attempt = 0
+        while True:
+            error = None
+            response = None
+            try:
+                response = await self._send(method, path, endpoint, kwargs)
+            except httpx.TransportError as e:
+                error = e
+            # Solo los GET (idempotentes) se reintentan
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            attempt += 1
+            if method != "GET" or not retryable or attempt > MAX_RETRIES or not self._retry_budget.withdraw():
+                if error is not None:
+                    raise error
+                return response
+            authentik_request_retries_total.inc(method, endpoint)
+            await asyncio.sleep(backoff_delay(attempt, RETRY_BACKOFF))
+
+    async def _send(self, method: str, path: str, endpoint: str, kwargs: dict) -> httpx.Response:
+        async with self._semaphore:
+            authentik_requests_in_flight.inc()
+            start = time.perf_counter()
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except Exception as e:
+                authentik_requests_total.inc(method, endpoint, "error")
+                authentik_request_errors_total.inc(method, endpoint, type(e).__name__)
+                raise
+            finally:
+                authentik_request_duration_seconds.observe(time.perf_counter() - start, method, endpoint)
+                authentik_requests_in_flight.dec()
+        authentik_requests_total.inc(method, endpoint, str(response.status_code))
+        if response.status_code >= 500:
+            authentik_request_errors_total.inc(method, endpoint, "http_5xx")
+        return response
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def get_json(self, path: str, **kwargs) -> dict:
+        """
+        GET a la API de Authentik (con el token interno) que devuelve el cuerpo JSON o lanza
+        AuthentikError si la respuesta no es válida.
+        """
+        response = await self.get(path, api=True, **kwargs)
+        if response.status_code != 200:
+            raise AuthentikError(response.status_code)
+        try:
+            return response.json() if response.text.strip() else {}
+        except ValueError as e:
+            raise AuthentikError(502, f"Respuesta JSON inválida: {e}")
+
+    async def iter_pages(self, path: str, page_size: int = 100, params: Optional[dict] = None):
+        """
+        Recorre de forma perezosa un listado paginado de Authentik, devolviendo una página
+        (el JSON completo) cada vez. Solo se consulta la siguiente página cuando se solicita.
+        """
+        page = 1
+        while page:
+            data = await self.get_json(path, params={**(params or {}), "page": page, "page_size": page_size})
+            yield data
+            page = data.get("pagination", {}).get("next") or 0
+
+
+class AuthentikTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte httpx que envía las peticiones de otro cliente (el cliente OAuth de authlib:
+    metadatos OIDC, JWKS e intercambio del código por el token) a través de AuthentikClient,
+    de modo que usan el mismo pool, circuit breaker por endpoint, plazo total y métricas.
+    No añade el token interno: las cabeceras (p. ej. la autenticación del cliente OAuth) se
+    reenvían tal cual.
+    """
+    def __init__(self, client: AuthentikClient):
+        self.client = client
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        headers = [(k, v) for k, v in request.headers.multi_items() if k.lower() not in ("host", "content-length")]
+        return await self.client.request(request.method, str(request.url), headers=headers, content=await request.aread())
+
+
+# Instancia única utilizada por todos los routers
+authentik_client = AuthentikClient(url, os.getenv("INTERNAL_TOKEN"))
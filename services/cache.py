@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+import itertools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from loggers.logger import get_logger
+
+logger = get_logger("CacheModule")
+
+# TTL (segundos) de cada listado de Authentik, configurables desde .env
+DEFAULT_TTLS = {
+    "users": float(os.getenv("CACHE_TTL_USERS", "60")),
+    "groups": float(os.getenv("CACHE_TTL_GROUPS", "300")),
+    "roles": float(os.getenv("CACHE_TTL_ROLES", "300")),
+    "scopes": float(os.getenv("CACHE_TTL_SCOPES", "120")),
+    "access": float(os.getenv("CACHE_TTL_ACCESS", "300")),
+}
+# Ventana adicional durante la cual se sirve el dato vencido mientras se refresca en segundo plano
+STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "300"))
+# Antigüedad máxima del último dato válido que se muestra si Authentik falla (0 lo desactiva)
+STALE_IF_ERROR = float(os.getenv("CACHE_STALE_IF_ERROR", "86400"))
+# Número máximo de entradas (sumando todos los recursos); al superarlo se descartan las menos usadas
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "version")
+
+    def __init__(self, value: Any, fetched_at: float, version: int):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.version = version
+
+
+class ListingCache:
+    """
+    Caché en memoria para los listados de Authentik.
+    - Cada recurso tiene su propio TTL.
+    - Pasado el TTL, el dato se sigue sirviendo durante `stale_ttl` segundos mientras
+      se refresca en segundo plano (stale-while-revalidate).
+    - Las peticiones concurrentes sobre la misma clave comparten una única consulta
+      al servidor (single-flight).
+    - Con `get_or_stale`, si la consulta falla se devuelve el último dato válido
+      (hasta `stale_if_error` segundos de antigüedad) en lugar del error.
+    - Como mucho guarda `max_entries` entradas (LRU) y descarta las que ya no pueden servirse.
+    """
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        stale_ttl: float = STALE_TTL,
+        stale_if_error: float = STALE_IF_ERROR,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.ttls = dict(ttls)
+        self.stale_ttl = stale_ttl
+        self.stale_if_error = stale_if_error
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._generation: Dict[str, int] = {}
+        self._background: set = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._versions = itertools.count(1)
+
+    def _count(self, resource: str, field: str):
+        stats = self._stats.setdefault(resource, {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0, "stale_errors": 0,
+        })
+        stats[field] += 1
+
+    async def get(self, resource: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Devuelve el valor cacheado para (resource, key) o lo obtiene con `fetch`.
+        Las excepciones de `fetch` se propagan y el resultado no se almacena.
+        """
+        cache_key = (resource, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+            age = time.monotonic() - entry.fetched_at
+            ttl = self.ttls.get(resource, 0)
+            if age < ttl:
+                self._count(resource, "hits")
+                return entry.value
+            if age < ttl + self.stale_ttl:
+                self._count(resource, "stale_hits")
+                if cache_key not in self._inflight:
+                    self._count(resource, "refreshes")
+                    task = self._start_fetch(cache_key, fetch)
+                    self._background.add(task)
+                    task.add_done_callback(self._background_done)
+                return entry.value
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self._count(resource, "coalesced")
+        else:
+            self._count(resource, "misses")
+            task = self._start_fetch(cache_key, fetch)
+        return await asyncio.shield(task)
+
+    async def get_or_stale(
+        self, resource: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, Optional[float]]:
+        """
+        Como `get`, pero si la consulta falla y existe un dato anterior con menos de
+        `stale_if_error` segundos lo devuelve junto con su antigüedad (None si el dato es fresco).
+        """
+        try:
+            return await self.get(resource, key, fetch), None
+        except Exception:
+            entry = self._entries.get((resource, key))
+            if entry is None:
+                raise
+            age = time.monotonic() - entry.fetched_at
+            if age >= self.stale_if_error:
+                raise
+            self._count(resource, "stale_errors")
+            logger.warning(f"Authentik no disponible: se sirve '{resource}' de hace {age:.0f} s")
+            return entry.value, age
+
+    def _start_fetch(self, cache_key: Tuple[str, Hashable], fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._load(cache_key, fetch))
+        self._inflight[cache_key] = task
+        return task
+
+    async def _load(self, cache_key: Tuple[str, Hashable], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        resource = cache_key[0]
+        generation = self._generation.get(resource, 0)
+        try:
+            value = await fetch()
+        except Exception:
+            self._count(resource, "errors")
+            raise
+        finally:
+            if self._inflight.get(cache_key) is asyncio.current_task():
+                del self._inflight[cache_key]
+        # Si el recurso se invalidó mientras se consultaba, el resultado no se guarda
+        if self._generation.get(resource, 0) == generation:
+            self._store(cache_key, value)
+        return value
+
+    def _store(self, cache_key: Tuple[str, Hashable], value: Any):
+        now = time.monotonic()
+        self._entries[cache_key] = _Entry(value, now, next(self._versions))
+        self._entries.move_to_end(cache_key)
+        # Se descartan las entradas que ya no se servirían ni como dato vencido ni ante un error
+        for key in [key for key, entry in self._entries.items() if now - entry.fetched_at >= self._max_age(key[0])]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _max_age(self, resource: str) -> float:
+        return self.ttls.get(resource, 0) + max(self.stale_ttl, self.stale_if_error)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Error al refrescar la caché en segundo plano: {task.exception()}")
+
+    def version(self, resource: str, key: Hashable = None) -> int:
+        """
+        Versión de los datos cacheados para (resource, key); cambia cada vez que se obtienen
+        datos nuevos. Sirve como clave de los fragmentos de plantilla que dependen de ellos.
+        """
+        entry = self._entries.get((resource, key))
+        return entry.version if entry is not None else 0
+
+    def invalidate(self, resource: str):
+        """Descarta todas las entradas (y consultas en curso) de un recurso."""
+        self._generation[resource] = self._generation.get(resource, 0) + 1
+        for cache_key in [k for k in self._entries if k[0] == resource]:
+            del self._entries[cache_key]
+        for cache_key in [k for k in self._inflight if k[0] == resource]:
+            del self._inflight[cache_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos por recurso, para ajustar los TTL."""
+        return {
+            resource: {
+                **counters,
+                "ttl": self.ttls.get(resource, 0),
+                "entries": sum(1 for k in self._entries if k[0] == resource),
+            }
+            for resource, counters in self._stats.items()
+        }
+
+
+# Instancia única compartida por los routers
+listing_cache = ListingCache(DEFAULT_TTLS)
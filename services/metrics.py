@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# Intervalo de muestreo del retraso del event loop y retraso a partir del cual cuenta como bloqueo
+LOOP_SAMPLE_INTERVAL = float(os.getenv("METRICS_LOOP_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = 0.01
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base de las métricas en proceso. Los valores se guardan en un diccionario indexado por
+    la tupla de valores de las etiquetas; solo se actualizan desde el event loop, por lo que
+    no requieren bloqueos y cada actualización cuesta una búsqueda en el diccionario.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict = {}
+
+    def _samples(self):
+        for values, value in self._values.items():
+            yield self.name, _format_labels(self.labels, values), value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """Histograma con cubetas fijas; cada observación incrementa una sola cubeta."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            # [conteo por cubeta (la última es +Inf), suma, total]
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def _samples(self):
+        for values, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket", _format_labels(self.labels, values, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, values), total
+            yield f"{self.name}_count", _format_labels(self.labels, values), count
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas de la aplicación. Además de las métricas propias admite colectores:
+    funciones que, al generar /metrics, devuelven valores ya calculados por otros módulos
+    (cachés, pipeline de logs) como lista de (nombre, tipo, ayuda, {etiquetas: valor}).
+    """
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Genera todas las métricas en el formato de texto de Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    names = tuple(key for key, _ in labels)
+                    values = tuple(val for _, val in labels)
+                    lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Peticiones HTTP atendidas por la aplicación
+http_requests_total = registry.counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP", ("method", "route")
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "Peticiones HTTP en curso")
+
+# Llamadas salientes a la API de Authentik
+authentik_requests_total = registry.counter(
+    "authentik_requests_total", "Peticiones enviadas a Authentik", ("method", "endpoint", "status")
+)
+authentik_request_duration_seconds = registry.histogram(
+    "authentik_request_duration_seconds", "Duración de las peticiones a Authentik", ("method", "endpoint")
+)
+authentik_request_errors_total = registry.counter(
+    "authentik_request_errors_total", "Peticiones a Authentik fallidas (excepción o 5xx)", ("method", "endpoint", "reason")
+)
+authentik_request_retries_total = registry.counter(
+    "authentik_request_retries_total", "Reintentos de peticiones GET a Authentik", ("method", "endpoint")
+)
+authentik_requests_in_flight = registry.gauge("authentik_requests_in_flight", "Peticiones a Authentik en curso")
+authentik_circuit_state = registry.gauge(
+    "authentik_circuit_state", "Estado del circuit breaker por endpoint (0 cerrado, 1 semiabierto, 2 abierto)", ("endpoint",)
+)
+
+# Renderizado de plantillas
+template_render_seconds = registry.histogram(
+    "template_render_seconds", "Tiempo de renderizado de plantillas", ("template",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+# Retraso del event loop
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Retraso del event loop respecto al intervalo de muestreo",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+event_loop_blocked_seconds_total = registry.counter(
+    "event_loop_blocked_seconds_total", "Tiempo acumulado con el event loop bloqueado"
+)
+
+
+class LoopLagMonitor:
+    """
+    Tarea en segundo plano que duerme LOOP_SAMPLE_INTERVAL segundos y mide cuánto más tardó
+    en despertar: ese retraso es tiempo en el que el event loop estuvo ocupado sin ceder el control.
+    """
+    def __init__(self, interval: float = LOOP_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        """Reinicia los totales locales (las métricas de /metrics siguen siendo acumuladas)."""
+        self.samples = 0
+        self.blocked = 0.0
+        self.max_lag = 0.0
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - start - self.interval, 0.0)
+            event_loop_lag_seconds.observe(lag)
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            if lag > LOOP_BLOCK_THRESHOLD:
+                event_loop_blocked_seconds_total.inc(amount=lag)
+                self.blocked += lag
+
+    def snapshot(self) -> dict:
+        """Totales desde el último `reset`: muestras, tiempo bloqueado y retraso máximo."""
+        return {
+            "samples": self.samples,
+            "blocked_ms": round(self.blocked * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import inspect
+from typing import Awaitable, Callable, Dict, Optional, Union
+from loggers.logger import get_logger
+
+logger = get_logger("ReadinessModule")
+
+# Segundos entre reintentos de los pasos de precalentamiento que fallaron al arrancar
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+WarmupStep = Callable[[], Union[Awaitable[None], None]]
+
+
+class Readiness:
+    """
+    Estado de precalentamiento del worker, consultado por /readyz.
+    Cada paso (abrir pools, descargar metadatos OIDC y JWKS, compilar plantillas) se ejecuta
+    antes de aceptar tráfico; si alguno falla (p. ej. Authentik no responde) el worker arranca
+    igualmente, /readyz responde 503 y el paso se reintenta en segundo plano hasta completarse.
+    """
+    def __init__(self):
+        self.checks: Dict[str, bool] = {}
+        self.errors: Dict[str, str] = {}
+        self.stopping = False
+        self._pending: Dict[str, WarmupStep] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.checks) and all(self.checks.values()) and not self.stopping
+
+    async def _run_step(self, name: str, step: WarmupStep) -> bool:
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            self.checks[name] = False
+            self.errors[name] = str(e) or type(e).__name__
+            logger.warning(f"Precalentamiento '{name}' fallido: {self.errors[name]}")
+            return False
+        self.checks[name] = True
+        self.errors.pop(name, None)
+        return True
+
+    async def warmup(self, steps: Dict[str, WarmupStep]):
+        """Ejecuta los pasos en orden y programa el reintento de los que fallen."""
+        self.stopping = False
+        for name in steps:
+            self.checks[name] = False
+        for name, step in steps.items():
+            if not await self._run_step(name, step):
+                self._pending[name] = step
+        if self._pending and self._task is None:
+            self._task = asyncio.create_task(self._retry())
+        logger.info(f"Precalentamiento terminado (listo: {self.ready})")
+
+    async def _retry(self):
+        while self._pending:
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            for name, step in list(self._pending.items()):
+                if await self._run_step(name, step):
+                    del self._pending[name]
+        self._task = None
+        logger.info("Precalentamiento completado tras reintentos")
+
+    async def stop(self):
+        """Marca el worker como no listo (para drenar el tráfico) y cancela los reintentos."""
+        self.stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "checks": dict(self.checks), "errors": dict(self.errors)}
+
+
+# Instancia única consultada por /readyz
+readiness = Readiness()
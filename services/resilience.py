@@ -0,0 +1,78 @@
+import time
+import random
+
+# Estados del circuit breaker (el valor numérico se exporta en /metrics)
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un endpoint de Authentik.
+    - Cerrado: las llamadas pasan; `failure_threshold` fallos seguidos lo abren.
+    - Abierto: las llamadas se rechazan de inmediato durante `recovery_timeout` segundos.
+    - Semiabierto: pasado ese tiempo se deja pasar una única llamada de prueba; si tiene éxito
+      el circuito se cierra y si falla vuelve a abrirse.
+    """
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Libera la llamada de prueba sin registrar resultado (p. ej. si se canceló)."""
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """Segundos que faltan para la siguiente llamada de prueba."""
+        return max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos compartido: cada petición aporta `ratio` fichas (hasta `max_tokens`)
+    y cada reintento consume una, de modo que los reintentos nunca superan esa fracción del
+    tráfico y no multiplican la carga sobre un Authentik que ya está fallando.
+    """
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 2.0) -> float:
+    """Espera antes del reintento `attempt` (desde 1): backoff exponencial con jitter completo."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
@@ -0,0 +1,200 @@
+import os
+import time
+import hashlib
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+import jwt
+import httpx
+from fastapi import Request, HTTPException
+from services.authentik import authentik_client, AuthentikError
+from services.token_manager import token_manager
+from loggers.logger import get_logger, set_log_user
+
+logger = get_logger("SecurityModule")
+
+JWKS_URL = os.getenv("AUTHENTIK_JWKS_URL")
+CLIENT_ID = os.getenv("AUTHENTIK_CLIENT_ID")
+CLIENT_SECRET = os.getenv("AUTHENTIK_CLIENT_SECRET")
+# Refresco periódico del JWKS y espera mínima entre consultas provocadas por un `kid` desconocido
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+# Número máximo de tokens ya verificados que se recuerdan
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+# Grupos de Authentik (claim "groups") con acceso a las rutas de administración
+ADMIN_GROUPS = {group.strip() for group in os.getenv("ADMIN_GROUPS", "Administrador,authentik Admins").split(",") if group.strip()}
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "PS256", "PS384", "PS512"]
+
+
+class JWKSCache:
+    """
+    Copia local del JWKS de Authentik, indexada por `kid`.
+    Se refresca periódicamente en segundo plano y solo se vuelve a consultar antes de
+    tiempo cuando llega un token firmado con un `kid` desconocido.
+    """
+    def __init__(self, jwks_url: Optional[str]):
+        self.jwks_url = jwks_url
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        # Último JWKS descargado, tal cual (se comparte con el cliente OAuth)
+        self.jwks: dict = {}
+        self._last_fetch = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._keys)
+
+    async def refresh(self):
+        response = await authentik_client.get(self.jwks_url)
+        if response.status_code != 200:
+            raise AuthentikError(response.status_code, "Error al consultar el JWKS")
+        data = response.json()
+        keys = {}
+        for jwk in data.get("keys", []):
+            try:
+                keys[jwk.get("kid", "")] = jwt.PyJWK(jwk)
+            except jwt.PyJWTError as e:
+                logger.warning(f"Clave JWKS ignorada: {e}")
+        self._keys = keys
+        self.jwks = data
+        self._last_fetch = time.monotonic()
+
+    async def get_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        key = self._keys.get(kid)
+        if key is not None or not self.jwks_url:
+            return key
+        # `kid` desconocido: se consulta de nuevo el JWKS (una sola vez para peticiones concurrentes)
+        async with self._lock:
+            key = self._keys.get(kid)
+            if key is None and time.monotonic() - self._last_fetch >= JWKS_MIN_REFETCH_INTERVAL:
+                await self.refresh()
+                key = self._keys.get(kid)
+        return key
+
+    async def _run(self):
+        while True:
+            if self.loaded:
+                # Si el JWKS ya se descargó (p. ej. al precalentar) se espera a que toque refrescarlo
+                await asyncio.sleep(max(JWKS_REFRESH_INTERVAL - (time.monotonic() - self._last_fetch), 0))
+            try:
+                await self.refresh()
+            except (AuthentikError, httpx.HTTPError, ValueError) as e:
+                logger.error(f"Error al refrescar el JWKS: {e}")
+                await asyncio.sleep(JWKS_MIN_REFETCH_INTERVAL)
+
+    def start(self):
+        """Inicia el refresco periódico del JWKS. Se invoca al arrancar la aplicación."""
+        if self._task is None and self.jwks_url:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class VerifiedTokenCache:
+    """LRU acotado de tokens ya verificados (clave: hash del token) válido hasta su `exp`."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims.get("exp", 0) <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, key: str, claims: dict):
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+jwks_cache = JWKSCache(JWKS_URL)
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE)
+
+
+async def verify_token(token: str) -> dict:
+    """
+    Verifica firma, expiración y audiencia del access token y devuelve sus claims.
+    Lanza jwt.InvalidTokenError (o una subclase) si el token no es válido.
+    """
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    claims = token_cache.get(cache_key)
+    if claims is not None:
+        return claims
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        try:
+            jwk = await jwks_cache.get_key(header.get("kid", ""))
+        except (AuthentikError, httpx.HTTPError, ValueError) as e:
+            raise jwt.InvalidTokenError(f"No se pudo obtener el JWKS: {e}")
+        if jwk is None:
+            raise jwt.InvalidTokenError("Clave de firma desconocida")
+        key = jwk.key
+    elif algorithm == "HS256" and CLIENT_SECRET:
+        # Proveedores de Authentik sin clave de firma asimétrica firman con el client secret
+        key = CLIENT_SECRET
+    else:
+        raise jwt.InvalidAlgorithmError(f"Algoritmo no permitido: {algorithm}")
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=CLIENT_ID,
+        options={"require": ["exp"], "verify_aud": bool(CLIENT_ID)},
+    )
+    token_cache.put(cache_key, claims)
+    return claims
+
+
+async def verified_claims(request: Request) -> Optional[dict]:
+    """
+    Dependencia de FastAPI: renueva el token de la sesión si está por expirar (refresh token),
+    lo verifica una sola vez por petición y deja los claims en `request.state.claims`
+    (None si no hay token o no es válido).
+    El motivo del rechazo queda en `request.state.token_error` y el usuario verificado
+    se asocia a los logs de la petición.
+    """
+    request.state.claims = None
+    request.state.token_error = None
+    token = await token_manager.ensure_fresh(request.session)
+    if token:
+        try:
+            request.state.claims = await verify_token(token)
+            set_log_user(request.state.claims.get("preferred_username", "UnknownUser"))
+        except jwt.InvalidTokenError as e:
+            request.state.token_error = e
+    return request.state.claims
+
+
+def is_admin(claims: Optional[dict]) -> bool:
+    """Indica si los claims pertenecen a un miembro de alguno de los ADMIN_GROUPS."""
+    return bool(claims) and not ADMIN_GROUPS.isdisjoint(claims.get("groups") or [])
+
+
+async def admin_claims(request: Request) -> Optional[dict]:
+    """
+    Dependencia de las rutas de administración: como `verified_claims`, pero responde 403 si el
+    usuario autenticado no pertenece a ADMIN_GROUPS. Sin token válido devuelve None y cada ruta
+    decide cómo responder (redirigir al login o 401).
+    """
+    claims = await verified_claims(request)
+    if claims is not None and not is_admin(claims):
+        logger.warning(f"Acceso denegado a {request.url.path}: el usuario no es administrador")
+        raise HTTPException(status_code=403, detail="Acceso restringido a administradores")
+    return claims
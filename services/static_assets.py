@@ -0,0 +1,177 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Optional
+from starlette.datastructures import Headers
+from starlette.responses import Response, PlainTextResponse
+from loggers.logger import get_logger
+
+try:  # Dependencia opcional: si no está instalada solo se sirven variantes gzip
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+logger = get_logger("StaticAssetsModule")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+
+
+class Asset:
+    """Archivo estático cargado en memoria junto con su hash y sus variantes comprimidas."""
+    __slots__ = ("content", "media_type", "digest", "variants")
+
+    def __init__(self, content: bytes, media_type: str):
+        self.content = content
+        self.media_type = media_type
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        # Variantes por codificación: {"br": bytes, "gzip": bytes}
+        self.variants: Dict[str, bytes] = {}
+        if len(content) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_TYPES):
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants["br"] = compressed
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants["gzip"] = compressed
+
+
+class StaticAssets:
+    """
+    Aplicación ASGI que sustituye a StaticFiles para la carpeta `static/`.
+    - Al arrancar (o en el primer uso si no hubo precalentamiento) calcula el hash del
+      contenido de cada archivo y expone su nombre con huella (p. ej. `styles.<hash>.css`),
+      que se sirve con Cache-Control immutable.
+    - Las rutas sin huella se sirven con ETag fuerte y revalidación (304 si no cambió).
+    - Entrega la variante brotli o gzip precalculada según Accept-Encoding.
+    """
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets: Dict[str, Asset] = {}
+        self._fingerprinted: Dict[str, str] = {}
+        self._urls: Dict[str, str] = {}
+        self._loaded = False
+
+    def load(self):
+        """Lee y comprime los archivos de la carpeta. Se invoca en el precalentamiento o con el primer uso."""
+        assets, fingerprinted, urls = {}, {}, {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    content = f.read()
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = Asset(content, media_type)
+                base, ext = os.path.splitext(rel_path)
+                hashed_path = f"{base}.{asset.digest}{ext}"
+                assets[rel_path] = asset
+                fingerprinted[hashed_path] = rel_path
+                urls[rel_path] = f"{self.prefix}/{hashed_path}"
+        self._assets, self._fingerprinted, self._urls = assets, fingerprinted, urls
+        self._loaded = True
+        logger.info(f"Archivos estáticos cargados: {len(assets)}")
+
+    def url(self, path: str) -> str:
+        """Helper para las plantillas: URL con huella del archivo (o la URL normal si no existe)."""
+        if not self._loaded:
+            self.load()
+        path = path.lstrip("/")
+        return self._urls.get(path, f"{self.prefix}/{path}")
+
+    def _lookup(self, path: str):
+        if not self._loaded:
+            self.load()
+        if path in self._fingerprinted:
+            return self._assets[self._fingerprinted[path]], True
+        return self._assets.get(path), False
+
+    @staticmethod
+    def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+        """Codificaciones aceptadas con su q-value (1 si no se indica; inválido cuenta como 0)."""
+        accepted = {}
+        for part in accept_encoding.lower().split(","):
+            coding, *params = [item.strip() for item in part.split(";")]
+            if not coding:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            accepted[coding] = q
+        return accepted
+
+    @classmethod
+    def _choose_encoding(cls, asset: Asset, accept_encoding: str) -> Optional[str]:
+        """
+        Variante comprimida con mayor q-value entre las aceptadas (a igualdad, br antes que gzip).
+        Una codificación con q=0 nunca se usa; "*" cubre las que no se nombran explícitamente.
+        """
+        accepted = cls._parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q and encoding in asset.variants:
+                best, best_q = encoding, q
+        return best
+
+    @staticmethod
+    def _etag_matches(etag: str, if_none_match: str) -> bool:
+        """
+        Comparación débil de If-None-Match (RFC 9110 §13.1.2): se ignora el prefijo W/ en ambos
+        lados, así que valen los ETag que un proxy haya marcado como débiles, y "*" coincide siempre.
+        """
+        opaque = etag[2:] if etag.startswith("W/") else etag
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == opaque:
+                return True
+        return False
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.lstrip("/")
+
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+            await response(scope, receive, send)
+            return
+        asset, immutable = self._lookup(path)
+        if asset is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+            await response(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = self._choose_encoding(asset, request_headers.get("accept-encoding", ""))
+        etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+        headers = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+        }
+        if self._etag_matches(etag, request_headers.get("if-none-match", "")):
+            response = Response(status_code=304, headers=headers)
+        else:
+            if encoding:
+                headers["Content-Encoding"] = encoding
+            body = asset.variants[encoding] if encoding else asset.content
+            response = Response(body, headers=headers, media_type=asset.media_type)
+        await response(scope, receive, send)
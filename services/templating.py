@@ -0,0 +1,119 @@
+import os
+import time
+from collections import OrderedDict
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from fastapi.templating import Jinja2Templates
+from loggers.logger import get_logger
+from services.metrics import template_render_seconds
+
+logger = get_logger("TemplatingModule")
+
+# Carpeta de la caché de bytecode de Jinja2 (compartida por todos los workers)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+# Número máximo de fragmentos renderizados que se conservan en memoria
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+
+
+class FragmentCache:
+    """LRU acotado con el HTML ya renderizado de los fragmentos de plantilla."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+
+    def get(self, key: tuple):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Etiqueta `{% fragment "nombre", clave1, clave2 %}...{% endfragment %}` que renderiza el
+    bloque una sola vez por combinación de claves (p. ej. grupo de rol o versión de los datos)
+    y reutiliza el HTML en las peticiones siguientes.
+    Dentro del bloque solo deben usarse datos cubiertos por las claves, nunca datos del usuario.
+    Si alguna clave es None el bloque se renderiza sin caché.
+    """
+    tags = {"fragment"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache(FRAGMENT_CACHE_SIZE))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endfragment",), drop_needle=True)
+        call = self.call_method("_render_fragment", [nodes.Const(parser.name), nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, template_name, key_parts, caller):
+        if None in key_parts:
+            return caller()
+        key = (template_name, *key_parts)
+        cache = self.environment.fragment_cache
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+class TimedTemplate(jinja2.Template):
+    """Plantilla que registra su tiempo de renderizado en las métricas."""
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render_seconds.observe(time.perf_counter() - start, self.name)
+
+
+class LazyDirBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Caché de bytecode en disco que crea su carpeta al guardar la primera plantilla compilada."""
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
+
+
+def create_templates(directory: str) -> Jinja2Templates:
+    """
+    Crea el entorno de plantillas compartido por toda la aplicación, con caché de bytecode
+    en disco, la extensión de fragmentos cacheados y medición del tiempo de renderizado.
+    """
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,
+        bytecode_cache=LazyDirBytecodeCache(TEMPLATE_CACHE_DIR),
+        extensions=[FragmentCacheExtension],
+    )
+    env.template_class = TimedTemplate
+    return Jinja2Templates(env=env)
+
+
+def precompile_templates(templates: Jinja2Templates) -> int:
+    """Compila por adelantado todas las plantillas para que la primera petición no lo haga."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    logger.info(f"Plantillas precompiladas: {len(names)}")
+    return len(names)
@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Dict, Optional, Tuple
+import httpx
+from core import url
+from services.authentik import authentik_client, AuthentikError
+from loggers.logger import get_logger
+
+logger = get_logger("TokenManagerModule")
+
+CLIENT_ID = os.getenv("AUTHENTIK_CLIENT_ID")
+CLIENT_SECRET = os.getenv("AUTHENTIK_CLIENT_SECRET")
+TOKEN_URL = f"{url}/application/o/token/"
+# Segundos antes de la expiración en los que se renueva el access token
+REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "60"))
+# Tiempo durante el que se reutiliza una renovación ya hecha para el mismo refresh token
+RECENT_TTL = 30.0
+
+
+def store_token(session, token_data: dict, previous_refresh_token: Optional[str] = None):
+    """Guarda en la sesión el access token, el refresh token y el instante de expiración."""
+    session["token"] = token_data["access_token"]
+    refresh_token = token_data.get("refresh_token") or previous_refresh_token
+    if refresh_token:
+        session["refresh_token"] = refresh_token
+    expires_at = token_data.get("expires_at")
+    if not expires_at and token_data.get("expires_in"):
+        expires_at = int(time.time()) + int(token_data["expires_in"])
+    if expires_at:
+        session["token_expires_at"] = int(expires_at)
+
+
+class TokenManager:
+    """
+    Renueva los access tokens con el refresh token poco antes de que expiren, evitando
+    que el usuario tenga que repetir el flujo OAuth completo. Las renovaciones simultáneas
+    de la misma sesión (mismo refresh token) comparten una única llamada a Authentik.
+    """
+    def __init__(self, margin: float = REFRESH_MARGIN):
+        self.margin = margin
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: Dict[str, Tuple[dict, float]] = {}
+
+    async def _refresh(self, refresh_token: str) -> dict:
+        data = {"grant_type": "refresh_token", "refresh_token": refresh_token}
+        if CLIENT_SECRET:
+            # Autenticación del cliente confidencial con HTTP Basic (client_secret_basic)
+            response = await authentik_client.post(TOKEN_URL, data=data, auth=(CLIENT_ID, CLIENT_SECRET))
+        else:
+            response = await authentik_client.post(TOKEN_URL, data={**data, "client_id": CLIENT_ID})
+        if response.status_code != 200:
+            raise AuthentikError(response.status_code, "Error al renovar el access token")
+        token_data = response.json()
+        if not token_data.get("access_token"):
+            raise AuthentikError(502, "La renovación no devolvió access token")
+        return token_data
+
+    async def _refresh_once(self, refresh_token: str) -> dict:
+        key = hashlib.sha256(refresh_token.encode()).hexdigest()
+        now = time.monotonic()
+        recent = self._recent.get(key)
+        if recent is not None and now - recent[1] < RECENT_TTL:
+            return recent[0]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(refresh_token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        token_data = await asyncio.shield(task)
+        # Peticiones que llegan justo después con la sesión anterior reutilizan el resultado
+        self._recent = {k: v for k, v in self._recent.items() if now - v[1] < RECENT_TTL}
+        self._recent[key] = (token_data, now)
+        return token_data
+
+    async def ensure_fresh(self, session) -> Optional[str]:
+        """
+        Devuelve un access token vigente para la sesión, renovándolo si está por expirar.
+        Si la renovación falla devuelve el token actual y la verificación decidirá.
+        """
+        token = session.get("token")
+        refresh_token = session.get("refresh_token")
+        expires_at = session.get("token_expires_at")
+        if not token or not refresh_token or not expires_at:
+            return token
+        if expires_at - time.time() > self.margin:
+            return token
+        try:
+            token_data = await self._refresh_once(refresh_token)
+        except (AuthentikError, httpx.HTTPError, ValueError) as e:
+            logger.warning(f"No se pudo renovar el access token: {e}")
+            return token
+        store_token(session, token_data, refresh_token)
+        logger.info("Access token renovado con refresh token")
+        return session["token"]
+
+
+# Instancia única compartida por las dependencias de autenticación
+token_manager = TokenManager()
@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import asyncio
+import httpx
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+from services.authentik import authentik_client, AuthentikError
+from loggers.logger import get_logger
+
+logger = get_logger("UserIndexModule")
+
+# Intervalos de sincronización (segundos), configurables desde .env
+SYNC_INTERVAL = float(os.getenv("USER_INDEX_SYNC_INTERVAL", "60"))
+FULL_SYNC_INTERVAL = float(os.getenv("USER_INDEX_FULL_SYNC_INTERVAL", "3600"))
+SYNC_PAGE_SIZE = 100
+
+_NON_ALNUM = re.compile(r"[^0-9A-Za-z]")
+
+
+def _normalize_id(value) -> str:
+    """Normaliza cédula/RIF/uid para la búsqueda exacta (sin puntos, guiones ni espacios)."""
+    return _NON_ALNUM.sub("", str(value)).upper() if value else ""
+
+
+class UserRecord:
+    """Registro compacto con los campos del usuario necesarios para la búsqueda."""
+    __slots__ = ("pk", "username", "email", "name", "cedula", "rif", "uid", "last_updated")
+
+    def __init__(self, user: dict):
+        attributes = user.get("attributes") or {}
+        self.pk = user.get("pk")
+        self.username = user.get("username") or ""
+        self.email = user.get("email") or ""
+        self.name = user.get("name") or ""
+        self.cedula = attributes.get("cedula") or ""
+        self.rif = attributes.get("rif") or ""
+        self.uid = user.get("uid") or ""
+        self.last_updated = user.get("last_updated") or ""
+
+    def prefix_terms(self) -> Set[str]:
+        terms = {self.username.lower(), self.email.lower(), self.name.lower()}
+        terms.update(self.name.lower().split())
+        terms.discard("")
+        return terms
+
+    def exact_terms(self) -> Set[str]:
+        terms = {_normalize_id(self.cedula), _normalize_id(self.rif), _normalize_id(self.uid)}
+        terms.discard("")
+        return terms
+
+    def to_dict(self) -> dict:
+        return {
+            "pk": self.pk, "username": self.username, "email": self.email, "name": self.name,
+            "cedula": self.cedula, "rif": self.rif, "uid": self.uid,
+        }
+
+
+class UserIndex:
+    """
+    Índice en memoria del directorio de usuarios de Authentik.
+    - Búsqueda por prefijo sobre username, email y nombre mediante una lista ordenada
+      de términos (bisect), más compacta que un trie de diccionarios.
+    - Búsqueda exacta por hash sobre cédula, RIF y uid.
+    - Se mantiene al día con una sincronización incremental (usuarios modificados desde
+      la última consulta) y una reconstrucción completa periódica que detecta bajas.
+    """
+    def __init__(self):
+        self._records: Dict[int, UserRecord] = {}
+        self._prefix: List[Tuple[str, int]] = []
+        self._exact: Dict[str, Set[int]] = {}
+        self._watermark = ""
+        self._last_full_sync = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- Mantenimiento del índice -------------------------------------------------
+
+    def _add(self, record: UserRecord):
+        self._records[record.pk] = record
+        for term in record.prefix_terms():
+            insort(self._prefix, (term, record.pk))
+        for term in record.exact_terms():
+            self._exact.setdefault(term, set()).add(record.pk)
+
+    def _remove(self, pk: int):
+        record = self._records.pop(pk, None)
+        if record is None:
+            return
+        for term in record.prefix_terms():
+            i = bisect_left(self._prefix, (term, pk))
+            if i < len(self._prefix) and self._prefix[i] == (term, pk):
+                del self._prefix[i]
+        for term in record.exact_terms():
+            pks = self._exact.get(term)
+            if pks is not None:
+                pks.discard(pk)
+                if not pks:
+                    del self._exact[term]
+
+    def upsert(self, user: dict):
+        record = UserRecord(user)
+        if record.pk is None:
+            return
+        self._remove(record.pk)
+        self._add(record)
+        if record.last_updated > self._watermark:
+            self._watermark = record.last_updated
+
+    def _replace(self, records: List[UserRecord]):
+        """Sustituye todo el contenido del índice (reconstrucción completa)."""
+        prefix = []
+        exact: Dict[str, Set[int]] = {}
+        for record in records:
+            prefix.extend((term, record.pk) for term in record.prefix_terms())
+            for term in record.exact_terms():
+                exact.setdefault(term, set()).add(record.pk)
+        prefix.sort()
+        self._records = {record.pk: record for record in records}
+        self._prefix = prefix
+        self._exact = exact
+        self._watermark = max((record.last_updated for record in records), default="")
+
+    # --- Consultas ----------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """Coincidencias exactas por cédula/RIF/uid primero y luego por prefijo."""
+        query = query.strip()
+        if not query:
+            return []
+        found: List[int] = []
+        seen: Set[int] = set()
+        for pk in self._exact.get(_normalize_id(query), ()):
+            if pk not in seen:
+                seen.add(pk)
+                found.append(pk)
+        prefix = query.lower()
+        i = bisect_left(self._prefix, (prefix,))
+        while len(found) < limit and i < len(self._prefix):
+            term, pk = self._prefix[i]
+            if not term.startswith(prefix):
+                break
+            if pk not in seen:
+                seen.add(pk)
+                found.append(pk)
+            i += 1
+        return [self._records[pk].to_dict() for pk in found[:limit]]
+
+    # --- Sincronización con Authentik ---------------------------------------------
+
+    async def full_sync(self):
+        records = []
+        async for data in authentik_client.iter_pages("/api/v3/core/users/", page_size=SYNC_PAGE_SIZE):
+            records.extend(UserRecord(user) for user in data.get("results", []) if user.get("pk") is not None)
+        self._replace(records)
+        self._last_full_sync = time.monotonic()
+        self.ready = True
+        logger.info(f"Índice de usuarios reconstruido ({len(records)} usuarios)")
+
+    async def incremental_sync(self):
+        params = {"ordering": "last_updated"}
+        if self._watermark:
+            params["last_updated__gt"] = self._watermark
+        changed = 0
+        async for data in authentik_client.iter_pages("/api/v3/core/users/", page_size=SYNC_PAGE_SIZE, params=params):
+            for user in data.get("results", []):
+                self.upsert(user)
+                changed += 1
+        if changed:
+            logger.info(f"Índice de usuarios actualizado ({changed} cambios)")
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.ready or time.monotonic() - self._last_full_sync >= FULL_SYNC_INTERVAL:
+                    await self.full_sync()
+                else:
+                    await self.incremental_sync()
+            except (AuthentikError, httpx.HTTPError) as e:
+                logger.error(f"Error al sincronizar el índice de usuarios: {e}")
+            await asyncio.sleep(SYNC_INTERVAL)
+
+    def start(self):
+        """Inicia la sincronización en segundo plano. Se invoca al arrancar la aplicación."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Instancia única compartida por los routers
+user_index = UserIndex()